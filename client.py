@@ -1,10 +1,12 @@
 import asyncio
 import logging
+import mmap
 import socket
+import sys
+import threading
 import psutil  # 替换 netifaces
 import time
-import os
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from src.transport.udp import QuicTransport
 from src.connection.connection import QuicConnection, Path
 from src.packet.header import Header, PacketType
@@ -23,9 +25,15 @@ class NetworkInterface:
         self.name = name
         self.ip = ip
         self.transport: Optional[QuicTransport] = None
+        self.local_port: Optional[int] = None  # 端点建立后缓存本地端口
         self.is_active = False
 
 class QuicClient:
+    INTERFACE_CACHE_TTL = 30.0  # 网络接口列表缓存时间 (秒)
+    
+    # (扫描时间, {接口名: IPv4 地址})，在所有客户端实例间共享
+    _interface_cache: Optional[Tuple[float, Dict[str, str]]] = None
+    
     def __init__(self, server_host: str, server_port: int):
         self.server_addr = (server_host, server_port)
         self.interfaces: Dict[str, NetworkInterface] = {}
@@ -37,33 +45,49 @@ class QuicClient:
         self.transfer_stats = {}
         logger.info("QuicClient initialized")
     
+    @classmethod
+    def _scan_interfaces(cls) -> Dict[str, str]:
+        """扫描带有非回环 IPv4 地址的网络接口，结果在 TTL 内复用"""
+        now = time.monotonic()
+        cache = cls._interface_cache
+        if cache is not None and now - cache[0] < cls.INTERFACE_CACHE_TTL:
+            return cache[1]
+        
+        AF_INET = socket.AF_INET
+        found = {}
+        for iface, addrs in psutil.net_if_addrs().items():
+            # 每个接口取第一个非回环 IPv4 地址
+            ip = next((addr.address for addr in addrs
+                       if addr.family == AF_INET and not addr.address.startswith('127.')), None)
+            if ip is not None:
+                found[iface] = ip
+        
+        cls._interface_cache = (now, found)
+        return found
+    
     def discover_interfaces(self):
         """发现可用的网络接口"""
-        for iface, addrs in psutil.net_if_addrs().items():
-            for addr in addrs:
-                # psutil 使用 family 属性来标识地址类型
-                if addr.family == socket.AF_INET:  # IPv4
-                    ip = addr.address
-                    if not ip.startswith('127.'):  # 排除本地回环
-                        logger.info(f"Found interface {iface} with IP {ip}")
-                        self.interfaces[iface] = NetworkInterface(iface, ip)
-                        break  # 找到一个 IPv4 地址就跳出内层循环
+        for iface, ip in self._scan_interfaces().items():
+            logger.info(f"Found interface {iface} with IP {ip}")
+            self.interfaces[iface] = NetworkInterface(iface, ip)
     
     def handle_handshake_response(self):
         """处理握手响应"""
         logger.info("Handshake response received, marking connection as established")
         if self.connection:
-            self.connection.is_established = True
+            self.connection.handshake_complete()
             self._handshake_complete.set()
     
     async def setup_interface(self, interface: NetworkInterface):
         """为网络接口设置 QUIC 传输"""
         transport = QuicTransport()
-        transport.client = self  # 设置客户端引用
+        transport.bind_client(self)  # 设置客户端引用
         try:
             await transport.create_endpoint(interface.ip, 0)
+            transport.set_socket_buffers()
             transport.on_handshake_complete = self.handle_handshake_response
             interface.transport = transport
+            interface.local_port = transport.transport.get_extra_info('sockname')[1]
             interface.is_active = True
             logger.info(f"Setup complete for interface {interface.name}")
             return True
@@ -80,36 +104,34 @@ class QuicClient:
         if not self.interfaces:
             raise RuntimeError("No suitable network interfaces found")
         
-        # 设置所有接口
-        for interface in self.interfaces.values():
-            await self.setup_interface(interface)
+        # 并行设置所有接口，单个接口失败不影响启动
+        interfaces = list(self.interfaces.values())
+        results = await asyncio.gather(
+            *(self.setup_interface(interface) for interface in interfaces),
+            return_exceptions=True
+        )
+        ready = [interface for interface, ok in zip(interfaces, results) if ok is True]
+        if not ready:
+            raise RuntimeError("Failed to set up any network interface")
             
-        # 选择第一个接口作为初始接口
-        self.active_interface = next(iter(self.interfaces.values()))
+        # 选择第一个可用接口作为初始接口
+        self.active_interface = ready[0]
         logger.info(f"Selected active interface: {self.active_interface.name}")
         
         # 创建连接
-        conn_id = os.urandom(8)
+        conn_id = Header.generate_connection_id()
         self.connection = QuicConnection(conn_id, is_client=True)
         self.connection.transport = self.active_interface.transport
-        self.active_interface.transport.connections[conn_id] = self.connection
+        self.active_interface.transport.add_connection(conn_id, self.connection)
         
-        # 发送 Initial 包
-        initial_packet = PacketProcessor.create_packet(
-            Header(
-                PacketType.INITIAL,
-                destination_connection_id=os.urandom(8),
-                source_connection_id=conn_id
-            ),
-            []
+        self.connection.active_path = Path(
+            (self.active_interface.ip, self.active_interface.local_port), self.server_addr
         )
         
-        logger.info(f"Starting handshake with source CID: {conn_id.hex()}")
-        self.active_interface.transport.send_datagram(initial_packet, self.server_addr)
-        
-        # 等待连接建立
+        # 发送 Initial 包，未收到响应时按 PTO 重传，等待连接建立
         try:
-            await asyncio.wait_for(self._handshake_complete.wait(), timeout=10.0)
+            await asyncio.wait_for(self.connection.start_handshake(), timeout=10.0)
+            await self._handshake_complete.wait()
             logger.info("Connection established successfully")
             return True
         except asyncio.TimeoutError:
@@ -125,17 +147,14 @@ class QuicClient:
             raise ValueError(f"Interface {interface_name} not found")
         
         new_interface = self.interfaces[interface_name]
-        if not new_interface.is_active:
-            await self.setup_interface(new_interface)
+        if not new_interface.is_active and not await self.setup_interface(new_interface):
+            raise RuntimeError(f"Failed to set up interface {interface_name}")
         
         if not self.connection:
             raise RuntimeError("No active connection")
         
         # 创建新路径
-        new_path = Path(
-            (new_interface.ip, new_interface.transport.transport.get_extra_info('socket').getsockname()[1]),
-            self.server_addr
-        )
+        new_path = Path((new_interface.ip, new_interface.local_port), self.server_addr)
         
         # 保存旧的连接 ID 用于比较
         old_connection_id = self.connection.connection_id.hex()
@@ -168,15 +187,20 @@ class QuicClient:
             logger.error("Cannot request file: connection not established")
             return
             
-        logger.info(f"Requesting file: {filename}")
+        logger.info("Requesting file: %s", filename)
         
         # 初始化文件接收状态
         self.receiving_files[filename] = {
             'size': None,
             'chunk_size': None,
             'total_chunks': None,
-            'start_time': time.time(),
-            'received_chunks': {},
+            'start_time': None,  # 收到文件响应时记录
+            'buffer': None,  # 收到文件响应后按文件大小预分配
+            'received': None,  # 每块一个字节的已收标志，重复的数据块不重复计数
+            'store_chunk': None,  # 收到文件响应后按块大小生成的写入函数
+            'bytes_received': 0,
+            'chunks_received': 0,
+            'pending_chunks': {},  # 文件响应之前到达的数据块
             'complete': False
         }
         self.transfer_complete.clear()
@@ -199,45 +223,103 @@ class QuicClient:
             
     def handle_file_response(self, frame: FileResponseFrame, filename: str):
         """处理文件响应"""
-        logger.info(f"收到文件响应: 大小={frame.file_size}, 分片大小={frame.chunk_size}")
+        logger.info("收到文件响应: 大小=%d, 分片大小=%d", frame.file_size, frame.chunk_size)
         
         if filename not in self.receiving_files:
-            logger.error(f"未找到文件信息: {filename}")
+            logger.error("未找到文件信息: %s", filename)
             return
             
         file_info = self.receiving_files[filename]
+        if (file_info['buffer'] is not None and file_info['size'] == frame.file_size
+                and file_info['chunk_size'] == frame.chunk_size):
+            # 重复的文件响应: 保留已收到的数据块
+            logger.info("忽略重复的文件响应: %s", filename)
+            return
+        
         file_info['size'] = frame.file_size
         file_info['chunk_size'] = frame.chunk_size
-        file_info['start_time'] = time.time()  # 重置开始时间
+        file_info['total_chunks'] = -(-frame.file_size // frame.chunk_size)
+        file_info['start_time'] = time.time()
+        # 首次响应 (或文件大小变化) 时按文件大小分配缓冲区和已收块位图
+        # 匿名映射按需分配零页；bytearray 会在事件循环里一次性清零整个文件大小的内存，
+        # 大文件时阻塞数毫秒，期间到达的数据块会溢出套接字接收缓冲区
+        file_info['buffer'] = mmap.mmap(-1, frame.file_size) if frame.file_size else bytearray()
+        file_info['received'] = bytearray(file_info['total_chunks'])
+        file_info['bytes_received'] = 0
+        file_info['chunks_received'] = 0
+        file_info['store_chunk'] = store_chunk = self._make_chunk_writer(file_info)
         
-        logger.info(f"文件传输开始: {filename}")
+        logger.info("文件传输开始: %s", filename)
+        
+        # 写入在文件响应之前到达的数据块
+        pending = file_info['pending_chunks']
+        for chunk_id, data in pending.items():
+            store_chunk(chunk_id, data)
+        pending.clear()
+        if file_info['bytes_received'] >= file_info['size']:
+            self._finish_transfer(filename, file_info)
         
     def handle_file_data(self, frame: FileDataFrame, filename: str):
         """处理文件数据"""
         if filename not in self.receiving_files:
-            logger.error(f"No file info found for: {filename}")
+            logger.error("No file info found for: %s", filename)
             return
             
         file_info = self.receiving_files[filename]
-        file_info['received_chunks'][frame.chunk_id] = frame.data
+        store_chunk = file_info['store_chunk']
+        if store_chunk is None:
+            file_info['pending_chunks'][frame.chunk_id] = frame.data
+            return
         
-        if file_info.get('size') is not None:
-            current_size = sum(len(chunk) for chunk in file_info['received_chunks'].values())
-            if current_size >= file_info['size']:
-                # 打印传输性能报告
-                elapsed_time = time.time() - file_info['start_time']
-                throughput = current_size / (1024 * 1024 * elapsed_time)  # MB/s
-                
-                logger.info("\n=== 文件传输完成报告 ===")
-                logger.info(f"文件名称: {filename}")
-                logger.info(f"文件大小: {current_size / (1024*1024):.2f} MB")
-                logger.info(f"传输时间: {elapsed_time:.2f} 秒")
-                logger.info(f"平均带宽: {throughput:.2f} MB/s")
-                logger.info(f"总分片数: {len(file_info['received_chunks'])}")
-                logger.info("========================")
-                
-                file_info['complete'] = True
-                self.transfer_complete.set()
+        store_chunk(frame.chunk_id, frame.data)
+        if file_info['bytes_received'] >= file_info['size'] and not file_info['complete']:
+            self._finish_transfer(filename, file_info)
+    
+    @staticmethod
+    def _make_chunk_writer(file_info: Dict):
+        """按本次传输固定的缓冲区和块大小生成数据块写入函数
+        
+        两者在文件响应后不再变化，直接绑定在闭包中，每个数据块不再从 file_info 中查找。
+        数据块只复制进内存中的预分配缓冲区，接收路径上没有逐块的写文件系统调用。
+        """
+        buffer = file_info['buffer']
+        received = file_info['received']
+        chunk_size = file_info['chunk_size']
+        buffer_size = len(buffer)
+        
+        def store_chunk(chunk_id: int, data: bytes):
+            """将数据块写入预分配的文件缓冲区"""
+            offset = chunk_id * chunk_size
+            end = offset + len(data)
+            if end > buffer_size:
+                logger.warning("Dropping out-of-range chunk %d", chunk_id)
+                return
+            if received[chunk_id]:
+                # 重复的数据报，已写入过
+                return
+            received[chunk_id] = 1
+            buffer[offset:end] = data
+            file_info['bytes_received'] += len(data)
+            file_info['chunks_received'] += 1
+        
+        return store_chunk
+    
+    def _finish_transfer(self, filename: str, file_info: Dict):
+        """文件接收完毕，打印传输性能报告"""
+        current_size = file_info['bytes_received']
+        elapsed_time = time.time() - file_info['start_time']
+        throughput = current_size / (1024 * 1024 * elapsed_time)  # MB/s
+        
+        logger.info("\n=== 文件传输完成报告 ===")
+        logger.info(f"文件名称: {filename}")
+        logger.info(f"文件大小: {current_size / (1024*1024):.2f} MB")
+        logger.info(f"传输时间: {elapsed_time:.2f} 秒")
+        logger.info(f"平均带宽: {throughput:.2f} MB/s")
+        logger.info(f"总分片数: {file_info['chunks_received']}")
+        logger.info("========================")
+        
+        file_info['complete'] = True
+        self.transfer_complete.set()
                 
     def print_congestion_stats(self):
         """打印拥塞控制统计信息"""
@@ -254,6 +336,35 @@ class QuicClient:
         logger.info(f"飞行中的包: {stats['in_flight']} / {stats['cwnd']}")
         logger.info("=====================")
 
+def _stdin_lines() -> asyncio.Queue:
+    """在守护线程中逐行读取标准输入并送入队列，EOF 时送入 None
+    
+    asyncio.to_thread(input) 的工作线程在 Ctrl-C 后仍阻塞在 input() 上，进程要等再按一次回车才能退出；
+    守护线程不会阻止进程退出。
+    """
+    loop = asyncio.get_running_loop()
+    lines: asyncio.Queue = asyncio.Queue()
+    
+    def reader():
+        try:
+            for line in sys.stdin:
+                loop.call_soon_threadsafe(lines.put_nowait, line.rstrip('\n'))
+            loop.call_soon_threadsafe(lines.put_nowait, None)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+    
+    threading.Thread(target=reader, name="stdin-reader", daemon=True).start()
+    return lines
+
+async def _prompt(lines: asyncio.Queue, prompt: str) -> str:
+    """打印提示并等待一行输入，事件循环继续处理收到的数据包"""
+    print(prompt, end='', flush=True)
+    line = await lines.get()
+    if line is None:
+        raise EOFError("stdin closed")
+    return line
+
 async def main():
     """主函数"""
     server_ip = "169.254.141.86"
@@ -268,8 +379,9 @@ async def main():
         logger.info("Connection established")
         
         # 2. 请求视频
+        lines = _stdin_lines()
         while True:
-            choice = input("\nChoose action:\n1. Request video\n2. Migrate connection\n3. Show congestion stats\n4. Quit\nYour choice: ")
+            choice = await _prompt(lines, "\nChoose action:\n1. Request video\n2. Migrate connection\n3. Show congestion stats\n4. Quit\nYour choice: ")
             
             if choice == '1':
                 logger.info("\nPhase 2: Requesting video file...")
@@ -284,7 +396,7 @@ async def main():
                 for name in client.interfaces:
                     print(f"- {name}")
                 
-                iface = input("\nEnter interface name to migrate to: ")
+                iface = await _prompt(lines, "\nEnter interface name to migrate to: ")
                 try:
                     await client.migrate_to_interface(iface)
                     logger.info(f"Successfully migrated to interface: {iface}")
@@ -1,12 +1,16 @@
 import asyncio
 import logging
+import mmap
+import os
+import signal
 from pathlib import Path
 import argparse
 from src.transport.udp import QuicTransport
 from src.connection.connection import QuicConnection
+from src.crypto.keypool import key_pool
 from src.packet.header import Header, PacketType
 from src.packet.packet_processor import PacketProcessor
-from src.packet.frame import FileRequestFrame, FileResponseFrame, FileDataFrame
+from src.packet.frame import FileRequestFrame, FileResponseFrame
 import socket
 import requests
 import urllib.request
@@ -17,13 +21,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger("quic.server")
 
+SEND_BATCH_SIZE = 32  # 每次 sendmmsg 发送的数据报数量
+DEFAULT_PACING_RATE = 20 * 1024 * 1024  # 默认发送速率 (bytes/s)
+
+# 多个 SO_REUSEPORT 套接字目前都由同一个事件循环线程处理，不增加并行度，
+# 且会让第二个服务器进程静默绑定同一端口并分走流量；因此默认只用一个套接字，需要时显式指定
+HAVE_REUSEPORT = hasattr(socket, 'SO_REUSEPORT')
+DEFAULT_WORKERS = 1
+
 class QuicServer:
-    def __init__(self, host: str, port: int, resource_path: str):
+    def __init__(self, host: str, port: int, resource_path: str,
+                 pacing_rate: int = DEFAULT_PACING_RATE, workers: int = DEFAULT_WORKERS):
         self.host = host
         self.port = port
-        self.transport = QuicTransport()
-        self.transport.server = self
+        self.pacing_rate = pacing_rate
+        
+        # 多个端点绑定同一端口，由内核按四元组分发数据包，共享一个连接表
+        workers = max(1, workers) if HAVE_REUSEPORT else 1
+        connections = QuicTransport.new_connection_table()
+        self.transports = [QuicTransport(connections) for _ in range(workers)]
+        for transport in self.transports:
+            transport.bind_server(self)
+        self.transport = self.transports[0]
         self.resource_path = Path(resource_path)
+        self._stop = asyncio.Event()
         
     async def handle_initial_packet(self, connection: QuicConnection, 
                                   header: Header, payload: bytes, addr: tuple[str, int]):
@@ -40,15 +61,12 @@ class QuicServer:
             source_connection_id=connection.connection_id
         )
         
-        # 获取服务器的公钥
-        public_key = connection.tls.get_public_key()
-        
         # 创建响应包
         response_packet = PacketProcessor.create_packet(response_header, [])
         
         # 发送响应
         logger.info(f"Sending Initial response to {addr}")
-        self.transport.send_datagram(response_packet, addr)
+        connection.transport.send_datagram(response_packet, addr)
         
         # 更新连接状态
         connection.is_established = True
@@ -78,36 +96,93 @@ class QuicServer:
             ),
             [response_frame]
         )
-        self.transport.send_datagram(response_packet, addr)
+        transport = connection.transport
+        transport.send_datagram(response_packet, addr)
+        
+        # 头部在整个传输过程中不变，只序列化一次
+        header_bytes = Header(
+            PacketType.SHORT,
+            connection.peer_connection_id,
+            connection.connection_id
+        ).to_bytes()
+        header_len = len(header_bytes)
+        packet_size = header_len + PacketProcessor.FILE_DATA_OVERHEAD + chunk_size
+        
+        # 批次中的每个位置复用一个预填头部的缓冲区
+        buffers = []
+        for _ in range(SEND_BATCH_SIZE):
+            buf = bytearray(packet_size)
+            buf[:header_len] = header_bytes
+            buffers.append(memoryview(buf))
+        
+        # 映射文件到内存，整个文件只映射一次，按偏移切片，不再逐块 read()
+        mm = None
+        view = memoryview(b'')
+        if file_size:
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                mm = mmap.mmap(fd, file_size, access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+            view = memoryview(mm)
         
-        # 分块发送文件数据
+        # 令牌桶: 额度按经过的时间 × pacing_rate 补充，容量为一个拥塞窗口，但至少两整批，
+        # 以吸收 sleep 唤醒延迟多出的额度；批满或桶空时发送，发送后额度不够下一整批就等待补充
+        congestion_control = connection.congestion_control
+        batch_bytes = SEND_BATCH_SIZE * packet_size
+        capacity = max(congestion_control.get_congestion_window() * packet_size, 2 * batch_bytes)
+        tokens = batch_bytes
+        
+        # 分块发送文件数据，按批次合并发送
         total_chunks = 0
-        with open(file_path, 'rb') as f:
-            chunk_id = 0
-            while True:
-                data = f.read(chunk_size)
-                if not data:
-                    break
-                    
-                data_frame = FileDataFrame(chunk_id, data)
-                data_packet = PacketProcessor.create_packet(
-                    Header(
-                        PacketType.SHORT,
-                        connection.peer_connection_id,
-                        connection.connection_id
-                    ),
-                    [data_frame]
-                )
-                self.transport.send_datagram(data_packet, addr)
-                chunk_id += 1
+        batch = []
+        
+        # 循环内使用的属性和全局名提前绑定到局部变量
+        pack_file_data = PacketProcessor.pack_file_data
+        send_batch = transport.send_datagram_batch
+        append = batch.append
+        get_window = congestion_control.get_congestion_window
+        sleep = asyncio.sleep
+        clock = asyncio.get_running_loop().time
+        pacing_rate = self.pacing_rate
+        batch_size = SEND_BATCH_SIZE
+        last_refill = clock()
+        try:
+            for chunk_id, offset in enumerate(range(0, file_size, chunk_size)):
+                buf = buffers[len(batch)]
+                packet_len = pack_file_data(buf, header_len, chunk_id, view[offset:offset + chunk_size])
+                append((buf[:packet_len], addr))
                 total_chunks += 1
-                await asyncio.sleep(0.001)  # 防止发送太快
+                tokens -= packet_len
+                
+                if len(batch) >= batch_size or tokens <= 0:
+                    send_batch(batch)
+                    batch.clear()
+                    
+                    # 按经过的时间补充令牌，不超过桶容量
+                    now = clock()
+                    capacity = max(get_window() * packet_size, 2 * batch_bytes)
+                    tokens = min(capacity, tokens + (now - last_refill) * pacing_rate)
+                    last_refill = now
+                    if tokens < batch_bytes:
+                        # 额度不够下一整批，等待补充
+                        await sleep((batch_bytes - tokens) / pacing_rate)
+                        now = clock()
+                        tokens = min(capacity, tokens + (now - last_refill) * pacing_rate)
+                        last_refill = now
+        finally:
+            view.release()
+            if mm is not None:
+                mm.close()
+        
+        if batch:
+            send_batch(batch)
         
         logger.info(f"文件发送完成: {frame.filename}")
         logger.info(f"总共发送了 {total_chunks} 个数据块")
     
-    async def get_public_ip(self):
-        """获取服务器的公网IP地址"""
+    def _lookup_public_ip(self) -> str:
+        """查询服务器的公网IP地址 (阻塞调用)"""
         try:
             # 尝试使用不同的服务获取公网IP
             try:
@@ -118,13 +193,13 @@ class QuicServer:
                 pass
             
             try:
-                response = urllib.request.urlopen('https://ident.me').read().decode('utf8')
+                response = urllib.request.urlopen('https://ident.me', timeout=5).read().decode('utf8')
                 return response
             except:
                 pass
             
             try:
-                response = urllib.request.urlopen('https://ifconfig.me').read().decode('utf8')
+                response = urllib.request.urlopen('https://ifconfig.me', timeout=5).read().decode('utf8')
                 return response
             except:
                 pass
@@ -133,38 +208,75 @@ class QuicServer:
         except Exception as e:
             logger.error(f"获取公网IP出错: {e}")
             return "获取公网IP失败"
+    
+    async def get_public_ip(self):
+        """获取服务器的公网IP地址，在线程池中执行以免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._lookup_public_ip)
+    
+    async def _report_public_ip(self):
+        """服务器开始服务后后台查询并打印公网IP"""
+        public_ip = await self.get_public_ip()
+        print(f"公网IP地址: {public_ip}")
+
+    def stop(self):
+        """请求服务器停止，start() 随后返回"""
+        self._stop.set()
 
     async def start(self):
         """启动 QUIC 服务器"""
         logger.info(f"Starting QUIC server on {self.host}:{self.port}")
-        await self.transport.create_endpoint(self.host, self.port)
+        reuse_port = len(self.transports) > 1
+        await self.transport.create_endpoint(self.host, self.port, reuse_port=reuse_port)
         
         # 打印服务器绑定信息
         local_addr = self.transport.transport.get_extra_info('sockname')
         logger.info(f"QUIC server is running on {local_addr[0]}:{local_addr[1]}")
         
-        # 获取公网IP
-        public_ip = await self.get_public_ip()
+        # 其余端点绑定到同一个 (可能是动态分配的) 端口
+        for transport in self.transports[1:]:
+            await transport.create_endpoint(self.host, local_addr[1], reuse_port=True)
+        if reuse_port:
+            logger.info(f"SO_REUSEPORT enabled with {len(self.transports)} sockets")
+        for transport in self.transports:
+            transport.set_socket_buffers()
         
         print(f"=== QUIC 服务器已启动 ===")
         print(f"本地监听地址: {local_addr[0]}")
         print(f"本地监听端口: {local_addr[1]}")
-        print(f"公网IP地址: {public_ip}")
         print(f"资源目录: {self.resource_path}")
         print(f"=========================")
         
-        # 扩展 QuicTransport 的处理逻辑
-        self.transport.handle_initial_packet = self.handle_initial_packet
+        # 提前在后台填充私钥池，首批连接无需同步生成密钥
+        key_pool.refill()
+        
+        # 开始服务后再在后台获取公网IP，不阻塞握手处理
+        public_ip_task = asyncio.create_task(self._report_public_ip())
+        
+        # 收到 SIGINT / SIGTERM 时停止服务器 (Windows 事件循环不支持信号处理器)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
         
         try:
-            # 保持服务器运行
-            while True:
-                await asyncio.sleep(3600)  # 每小时检查一次
+            # 保持服务器运行，直到收到停止请求
+            await self._stop.wait()
+            logger.info("Server shutting down...")
         except asyncio.CancelledError:
             logger.info("Server shutting down...")
         finally:
-            if self.transport.transport:
-                self.transport.transport.close()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError):
+                    pass
+            public_ip_task.cancel()
+            for transport in self.transports:
+                if transport.transport:
+                    transport.transport.close()
 
 async def main():
     # 解析命令行参数
@@ -172,15 +284,18 @@ async def main():
     parser.add_argument('--host', type=str, default='0.0.0.0', help='Bind address')
     parser.add_argument('--port', type=int, default=5000, help='Bind port')
     parser.add_argument('--dir', type=str, default='./resource', help='Resource directory')
+    parser.add_argument('--rate', type=float, default=DEFAULT_PACING_RATE / (1024 * 1024),
+                        help='Send pacing rate in MB/s')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Number of SO_REUSEPORT sockets (opt-in, all served by one event loop)')
     args = parser.parse_args()
     
     # 创建服务器实例，指定监听地址、端口和资源目录
-    server = QuicServer(args.host, args.port, args.dir)
+    server = QuicServer(args.host, args.port, args.dir, int(args.rate * 1024 * 1024), args.workers)
     try:
+        # 运行直到 stop() 或收到 SIGINT / SIGTERM
         await server.start()
-        # 保持服务器运行
-        while True:
-            await asyncio.sleep(3600)
+        print("服务器已停止")
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
         print("服务器已停止")
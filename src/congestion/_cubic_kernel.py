@@ -0,0 +1,58 @@
+"""CUBIC 每个 ACK 的窗口计算 (纯标量内核)
+
+安装 numba 时以 nopython 模式 JIT 编译，否则按普通 Python 函数执行。
+状态使用 CongestionState 的整数值。
+"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """numba 不可用时的空装饰器"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+SLOW_START = 0
+CONGESTION_AVOIDANCE = 1
+RECOVERY = 2
+
+@njit(cache=True, fastmath=True)
+def cubic_window(cwnd, w_max, t, k, C, MIN_W, MAX_W):
+    """CUBIC 窗口更新: W(t) = C*(t-K)^3 + W_max，返回 (cwnd, w_cubic)"""
+    dt = t - k
+    w_cubic = C * dt * dt * dt + w_max
+
+    # 确保窗口在合理范围内
+    w_cubic = max(MIN_W, min(MAX_W, w_cubic))
+
+    if w_cubic > cwnd:
+        cwnd = min(MAX_W, int(w_cubic))
+    return cwnd, w_cubic
+
+@njit(cache=True, fastmath=True)
+def cubic_step(cwnd, w_max, ssthresh, state, last_cong_time, in_flight,
+               rtt_est, sample_rtt, now, k, C, MIN_W, MAX_W):
+    """处理一个 ACK，返回 (cwnd, rtt_est, state)"""
+    rtt_est = 0.8 * rtt_est + 0.2 * sample_rtt  # 简单 EWMA
+
+    if state == SLOW_START:
+        # 慢启动阶段: 每个 ACK 增加一个 MSS
+        cwnd += 1
+        if cwnd >= ssthresh:
+            state = CONGESTION_AVOIDANCE
+    else:
+        # 拥塞避免 / 恢复阶段: 使用 CUBIC 算法
+        t = now - last_cong_time
+        if t >= 0.001:
+            cwnd, _ = cubic_window(cwnd, w_max, t, k, C, MIN_W, MAX_W)
+
+        # 如果所有丢失的包都已经重传并确认，退出恢复阶段
+        if state == RECOVERY and in_flight <= cwnd:
+            state = CONGESTION_AVOIDANCE
+
+    return cwnd, rtt_est, state
+
+# 导入时预热，JIT 编译不落在第一个 ACK 上。参数类型与 CubicCongestionControl 的实际调用一致:
+# cwnd / ssthresh / state / in_flight / 窗口上下限为 int，其余为 float
+cubic_step(10, 0.0, 50, SLOW_START, 0.0, 0, 100.0, 100.0, 1.0, 0.0, 0.4, 2, 1000)
@@ -1,8 +1,9 @@
 import time
-import math
+from typing import Optional
 from dataclasses import dataclass
 from enum import Enum
 import logging
+from ._cubic_kernel import cubic_step
 
 logger = logging.getLogger("quic.congestion.cubic")
 
@@ -25,6 +26,7 @@ class CubicCongestionControl:
     # CUBIC 参数
     BETA_CUBIC = 0.7  # 乘性减小因子
     C = 0.4  # CUBIC 增长因子
+    _K_FACTOR = (1 - BETA_CUBIC) / C  # K = (W_max * _K_FACTOR)^(1/3)
     
     # 通用拥塞控制参数
     INITIAL_WINDOW = 10  # 初始窗口 (packets)
@@ -39,14 +41,18 @@ class CubicCongestionControl:
         self.ssthresh = self.SLOW_START_THRESHOLD
         # 当前状态
         self.state = CongestionState.SLOW_START
+        # 传入 _cubic_kernel 的浮点状态始终保持 float，与内核预热时的参数类型一致，
+        # 安装 numba 时不会在第一个 ACK 上按新的类型签名重新编译
         # 最后一次拥塞事件时间
-        self.last_congestion_time = 0
+        self.last_congestion_time = 0.0
         # 最后一次拥塞事件前的窗口大小
-        self.w_max = 0
+        self.w_max = 0.0
+        # CUBIC 时间偏移 K，只在丢包时随 w_max 变化
+        self._k = 0.0
         # 最后一次窗口更新时间
         self.last_update_time = time.time()
         # RTT 估计 (ms)
-        self.rtt_estimate = 100  # 初始估计值
+        self.rtt_estimate = 100.0  # 初始估计值
         # 已发送但未确认的数据包数量
         self.in_flight = 0
         
@@ -59,43 +65,46 @@ class CubicCongestionControl:
     def on_packet_acked(self, packet_size: int, rtt: float):
         """确认数据包时调用"""
         self.in_flight -= 1
-        self.rtt_estimate = 0.8 * self.rtt_estimate + 0.2 * rtt  # 简单 EWMA
         
         current_time = time.time()
-        time_elapsed = current_time - self.last_update_time
         self.last_update_time = current_time
         
-        if self.state == CongestionState.SLOW_START:
-            # 慢启动阶段: 每个 ACK 增加一个 MSS
-            self.cwnd += 1
-            logger.debug(f"慢启动: cwnd = {self.cwnd}")
-            
-            # 检查是否应该退出慢启动
-            if self.cwnd >= self.ssthresh:
-                logger.info(f"退出慢启动: cwnd = {self.cwnd}, ssthresh = {self.ssthresh}")
-                self.state = CongestionState.CONGESTION_AVOIDANCE
-        
-        elif self.state == CongestionState.CONGESTION_AVOIDANCE:
-            # 拥塞避免阶段: 使用 CUBIC 算法
-            self._cubic_update(current_time)
+        # 标量计算交给 _cubic_kernel，这里只负责读写状态
+        state = self.state
+        self.cwnd, self.rtt_estimate, new_state = cubic_step(
+            self.cwnd, self.w_max, self.ssthresh, state.value, self.last_congestion_time,
+            self.in_flight, self.rtt_estimate, rtt, current_time, self._k,
+            self.C, self.MIN_WINDOW, self.MAX_WINDOW
+        )
         
-        elif self.state == CongestionState.RECOVERY:
-            # 恢复阶段: 使用 CUBIC 算法
-            self._cubic_update(current_time)
-            
-            # 如果所有丢失的包都已经重传并确认，退出恢复阶段
-            if self.in_flight <= self.cwnd:
+        if new_state != state.value:
+            self.state = CongestionState(new_state)
+            if state is CongestionState.SLOW_START:
+                logger.info(f"退出慢启动: cwnd = {self.cwnd}, ssthresh = {self.ssthresh}")
+            else:
                 logger.info(f"退出恢复阶段: cwnd = {self.cwnd}")
-                self.state = CongestionState.CONGESTION_AVOIDANCE
+        else:
+            logger.debug("%s: cwnd = %d", state.name, self.cwnd)
     
-    def on_packet_lost(self, packet_size: int):
-        """丢包时调用"""
+    def on_packet_lost(self, packet_size: int, sent_time: Optional[float] = None):
+        """丢包时调用
+        
+        每个丢失的包都移出在途计数；但同一恢复期内只减小一次窗口，
+        恢复期开始之前发出的包再丢失不再触发拥塞事件 (RFC 9002 §7.3.2)。
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if sent_time is not None and sent_time <= self.last_congestion_time:
+            return
+        
         # 记录当前最大窗口
-        self.w_max = self.cwnd
+        cwnd = self.cwnd
+        self.w_max = float(cwnd)
+        self._k = (cwnd * self._K_FACTOR) ** (1/3)
         
         # 乘性减小
-        self.cwnd = max(self.MIN_WINDOW, int(self.cwnd * self.BETA_CUBIC))
-        self.ssthresh = self.cwnd
+        cwnd = max(self.MIN_WINDOW, int(cwnd * self.BETA_CUBIC))
+        self.cwnd = cwnd
+        self.ssthresh = cwnd
         
         # 更新状态和时间
         self.state = CongestionState.RECOVERY
@@ -103,32 +112,6 @@ class CubicCongestionControl:
         
         logger.info(f"检测到丢包: cwnd = {self.cwnd}, ssthresh = {self.ssthresh}")
     
-    def _cubic_update(self, current_time: float):
-        """CUBIC 窗口更新"""
-        # CUBIC 公式: W(t) = C*(t-K)^3 + W_max
-        # 其中 K = (W_max*beta/C)^(1/3)
-        
-        # 计算自上次拥塞事件以来的时间 (秒)
-        t = current_time - self.last_congestion_time
-        if t < 0.001:  # 避免除零错误
-            return
-        
-        # 计算 K (时间偏移)
-        k = pow(self.w_max * (1 - self.BETA_CUBIC) / self.C, 1/3)
-        
-        # 计算新的窗口大小
-        w_cubic = self.C * pow(t - k, 3) + self.w_max
-        
-        # 确保窗口在合理范围内
-        w_cubic = max(self.MIN_WINDOW, min(self.MAX_WINDOW, w_cubic))
-        
-        # 更新拥塞窗口
-        if w_cubic > self.cwnd:
-            # 增加窗口
-            self.cwnd = min(self.MAX_WINDOW, int(w_cubic))
-        
-        logger.debug(f"CUBIC 更新: t = {t:.3f}, K = {k:.3f}, w_cubic = {w_cubic:.2f}, cwnd = {self.cwnd}")
-    
     def can_send_packet(self) -> bool:
         """检查是否可以发送新的数据包"""
         return self.in_flight < self.cwnd
@@ -1,17 +1,43 @@
 from dataclasses import dataclass
 from typing import Dict, Optional, Set, Tuple, List
 import asyncio
+import collections
 import logging
 import os
+import struct
 from ..crypto.tls import TlsContext, TlsState
+from ..crypto.keypool import key_pool
 from ..packet.header import PacketType, Header
-from ..packet.frame import Frame, PathChallengeFrame, PathResponseFrame
+from ..packet.frame import Frame, AckFrame
 from ..packet.packet_processor import PacketProcessor
 from ..congestion.cubic import CubicCongestionControl
+from .sent_packets import SentPacketTable
 import time
 
 logger = logging.getLogger("quic")
 
+_U64 = struct.Struct('>Q')
+
+class _RandomPool:
+    """一次 os.urandom 取出一大块随机字节，按 8 字节依次取用，减少系统调用"""
+    
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self._buf = b''
+        self._offset = 0
+    
+    def take_u64(self) -> int:
+        """取 8 字节随机数据，按大端 uint64 返回"""
+        if self._offset + 8 > len(self._buf):
+            self._buf = os.urandom(self.size)
+            self._offset = 0
+        start = self._offset
+        self._offset = start + 8
+        return _U64.unpack_from(self._buf, start)[0]
+
+# 所有连接共享的 PATH_CHALLENGE 随机数据池
+_challenge_pool = _RandomPool()
+
 @dataclass
 class Path:
     """表示一个网络路径"""
@@ -21,6 +47,17 @@ class Path:
 
 class QuicConnection:
     """QUIC 连接类"""
+    
+    RTT_SAMPLE_COUNT = 100  # 保留的 RTT 样本数量
+    
+    # 握手重传 (PTO): 首次超时取 max(初始值, 2*smoothed_rtt)，每次超时翻倍
+    HANDSHAKE_INITIAL_PTO = 0.2  # 秒
+    HANDSHAKE_MAX_PTO = 2.0  # 秒
+    HANDSHAKE_MAX_ATTEMPTS = 6
+    
+    # 比最大已确认包序号小 PACKET_THRESHOLD 以上仍未确认的包视为丢失 (RFC 9002 §6.1.1)
+    PACKET_THRESHOLD = 3
+    
     def __init__(self, connection_id: bytes, is_client: bool = False):
         self.connection_id = connection_id
         self.peer_connection_id: Optional[bytes] = None
@@ -34,14 +71,18 @@ class QuicConnection:
         self.validating_paths: Dict[tuple[str, int], Path] = {}
         
         # 路径验证
-        self.pending_path_challenges: Dict[bytes, Path] = {}
+        self.pending_path_challenges: Dict[int, Path] = {}
         
-        # TLS 上下文
-        self.tls = TlsContext(is_client)
+        # 对端通过 NEW_CONNECTION_ID 提供的连接 ID: 序列号 -> 连接 ID
+        self.peer_connection_ids: Dict[int, bytes] = {}
+        
+        # TLS 上下文，私钥从后台生成的密钥池中取用
+        self.tls = TlsContext(is_client, key_pool.get())
         
         # 连接状态
         self.is_client = is_client
         self.is_established = False
+        self._handshake_done = asyncio.Event()
         
         # 传输实例
         self.transport = None
@@ -50,7 +91,7 @@ class QuicConnection:
         self.congestion_control = CubicCongestionControl()
         
         # 添加 RTT 测量
-        self.rtt_samples = []
+        self.rtt_samples = collections.deque(maxlen=self.RTT_SAMPLE_COUNT)  # 固定容量的环形缓冲区
         self.smoothed_rtt = 0.1  # 初始值 100ms
         self.rtt_variance = 0
         self.min_rtt = float('inf')
@@ -59,21 +100,25 @@ class QuicConnection:
         # 添加包序号跟踪
         self.next_packet_number = 0
         self.largest_acked_packet = 0
-        self.sent_packets = {}  # packet_number -> (send_time, size)
+        self.sent_packets = SentPacketTable()  # packet_number -> (send_time, size)
         self.ack_queue = []  # 待确认的包序号队列
     
-    async def handle_path_challenge(self, challenge_data: bytes):
+    async def handle_path_challenge(self, challenge_data: int):
         """处理 PATH_CHALLENGE 帧"""
         # 发送 PATH_RESPONSE
         await self.send_path_response(challenge_data)
         
+    def _gen_challenge(self) -> int:
+        """生成 8 字节 PATH_CHALLENGE 数据 (uint64)"""
+        return _challenge_pool.take_u64()
+    
     async def send_path_challenge(self, path: Path):
         """发送 PATH_CHALLENGE 帧"""
-        challenge_data = os.urandom(8)
+        challenge_data = self._gen_challenge()
         self.pending_path_challenges[challenge_data] = path
         # TODO: 实际发送 PATH_CHALLENGE 帧
         
-    async def handle_path_response(self, response_data: bytes):
+    async def handle_path_response(self, response_data: int):
         """处理 PATH_RESPONSE 帧"""
         if response_data in self.pending_path_challenges:
             path = self.pending_path_challenges.pop(response_data)
@@ -88,7 +133,7 @@ class QuicConnection:
         # 创建 Initial 包
         header = Header(
             packet_type=PacketType.INITIAL,
-            destination_connection_id=self.peer_connection_id or os.urandom(8),
+            destination_connection_id=self.peer_connection_id or Header.generate_connection_id(),
             source_connection_id=self.connection_id
         )
         
@@ -96,9 +141,6 @@ class QuicConnection:
         logger.info(f"Starting handshake with source CID: {self.connection_id.hex()}, "
                    f"destination CID: {header.destination_connection_id.hex()}")
         
-        # 添加公钥
-        public_key = self.tls.get_public_key()
-        
         # 创建并发送 Initial 包
         packet = PacketProcessor.create_packet(header, [])
         
@@ -106,14 +148,26 @@ class QuicConnection:
         if not self.active_path:
             raise RuntimeError("No active path available")
             
-        # 记录日志
-        logger.info(f"Sending Initial packet to {self.active_path.peer_addr}")
-        
-        # 发送数据包
-        self._send_packet(packet, self.active_path.peer_addr)
-        
         # 更新状态
         self.tls.state = TlsState.WAIT_HANDSHAKE
+        
+        # 发送后等待握手完成，超时则重传并按指数退避延长等待时间
+        timeout = max(self.HANDSHAKE_INITIAL_PTO, 2 * self.smoothed_rtt)
+        for attempt in range(self.HANDSHAKE_MAX_ATTEMPTS):
+            logger.info(f"Sending Initial packet to {self.active_path.peer_addr} (attempt {attempt + 1})")
+            self._send_packet(packet, self.active_path.peer_addr)
+            try:
+                await asyncio.wait_for(self._handshake_done.wait(), timeout=timeout)
+                return
+            except asyncio.TimeoutError:
+                timeout = min(timeout * 2, self.HANDSHAKE_MAX_PTO)
+        
+        raise asyncio.TimeoutError("握手超时")
+    
+    def handshake_complete(self):
+        """握手完成，停止 Initial 重传"""
+        self.is_established = True
+        self._handshake_done.set()
     
     async def handle_handshake(self, data: bytes):
         """处理握手数据"""
@@ -132,7 +186,7 @@ class QuicConnection:
             # TODO: 发送服务端的公钥
             pass
         
-        self.is_established = True 
+        self.handshake_complete()
     
     async def validate_path(self, path: Path):
         """验证新路径"""
@@ -179,12 +233,12 @@ class QuicConnection:
         # 记录发送时间和大小
         packet_number = self.next_packet_number
         self.next_packet_number += 1
-        self.sent_packets[packet_number] = (time.time(), len(packet))
+        self.sent_packets.add(packet_number, time.time(), len(packet))
         
         # 通知拥塞控制
         self.congestion_control.on_packet_sent(len(packet))
         
-        # 实际发送数据包
+        # 实际发送数据包: 由传输层排队，本轮事件循环结束前与其他数据报合并为一次批量发送
         if self.transport:
             self.transport.send_datagram(packet, addr)
             return True
@@ -207,61 +261,76 @@ class QuicConnection:
             elif header.packet_type == PacketType.HANDSHAKE:
                 self._handle_handshake_packet(header, frames, addr)
             elif header.packet_type == PacketType.SHORT:
+                # Short 包中的 ACK 由帧处理表一并分派
                 self._handle_short_packet(header, frames, addr)
+                return header, frames
             
             # 处理确认
-            self._process_ack(packet)
+            for frame in frames:
+                if isinstance(frame, AckFrame):
+                    self.process_ack(frame)
             
             return header, frames
         except Exception as e:
             logger.error(f"处理数据包时出错: {e}")
             return None, []
     
-    def _process_ack(self, packet: bytes):
-        """处理确认信息"""
-        # 这里简化处理，假设每个收到的包都会触发一个确认
-        # 实际实现中，应该从包中提取确认信息
-        
-        # 生成一个随机的包序号作为被确认的包
-        # 在实际实现中，这应该从包中提取
-        if self.sent_packets:
-            # 随机选择一个已发送但未确认的包进行确认
-            # 实际中应该根据包中的确认信息
-            packet_number = list(self.sent_packets.keys())[0]
-            if packet_number in self.sent_packets:
-                send_time, size = self.sent_packets.pop(packet_number)
-                current_time = time.time()
-                rtt = current_time - send_time
-                
-                # 确保 RTT 是正值且合理
-                if rtt > 0.001:  # 至少 1ms
-                    self._update_rtt(rtt)
-                    logger.debug(f"测量 RTT: {rtt*1000:.2f} ms, 包序号: {packet_number}")
-                else:
-                    logger.warning(f"忽略异常 RTT 值: {rtt*1000:.2f} ms")
-                    
-                self.congestion_control.on_packet_acked(size, max(1, rtt * 1000))  # 确保至少 1ms
-                
-                # 更新最大确认包序号
-                self.largest_acked_packet = max(self.largest_acked_packet, packet_number)
-                
-                # 丢包检测
-                if len(self.sent_packets) > 20 and current_time - list(self.sent_packets.values())[0][0] > 1.0:
-                    # 模拟丢包
-                    old_packet = list(self.sent_packets.keys())[0]
-                    self.on_packet_lost(old_packet)
+    def process_ack(self, frame: AckFrame):
+        """处理 ACK 帧: 移除确认区间内的已发送包，并用最大确认包采样 RTT (RFC 9002 §5)"""
+        sent_packets = self.sent_packets
+        if not sent_packets:
+            return
+        current_time = time.time()
+        
+        # 只有最大确认包是新确认的包时才采样 RTT
+        largest_sent = sent_packets.get(frame.largest_acked)
+        if largest_sent is not None:
+            rtt = current_time - largest_sent[0]
+            ack_delay = frame.ack_delay / 1_000_000
+            if rtt - ack_delay >= self.min_rtt:
+                rtt -= ack_delay
+            
+            # 确保 RTT 是正值且合理
+            if rtt > 0.001:  # 至少 1ms
+                self._update_rtt(rtt)
+                logger.debug("测量 RTT: %.2f ms, 包序号: %d", rtt * 1000, frame.largest_acked)
+            else:
+                logger.warning("忽略异常 RTT 值: %.2f ms", rtt * 1000)
+        rtt_ms = max(1.0, (self.latest_rtt or self.smoothed_rtt) * 1000)  # 确保至少 1ms
+        
+        # 区间限制在在途包序号范围内，避免对方发来的超大区间导致长时间循环
+        oldest = sent_packets.oldest()
+        newest = self.next_packet_number - 1
+        for smallest, largest in frame.ranges:
+            for packet_number in range(max(smallest, oldest), min(largest, newest) + 1):
+                sent = sent_packets.pop(packet_number)
+                if sent is not None:
+                    self.congestion_control.on_packet_acked(sent[1], rtt_ms)
+        
+        # 更新最大确认包序号
+        if frame.largest_acked <= newest:
+            self.largest_acked_packet = max(self.largest_acked_packet, frame.largest_acked)
+        
+        # 丢包检测: 从最早的在途包开始检查
+        threshold = self.largest_acked_packet - self.PACKET_THRESHOLD
+        while sent_packets:
+            packet_number = sent_packets.oldest()
+            if packet_number > threshold:
+                break
+            self.on_packet_lost(packet_number)
     
     def on_packet_lost(self, packet_number: int):
         """处理丢包事件"""
-        if packet_number in self.sent_packets:
-            _, size = self.sent_packets.pop(packet_number)
-            self.congestion_control.on_packet_lost(size)
+        sent = self.sent_packets.pop(packet_number)
+        if sent is not None:
+            send_time, size = sent
+            self.congestion_control.on_packet_lost(size, send_time)
             logger.info(f"检测到丢包: 包序号 {packet_number}")
     
     def _update_rtt(self, sample_rtt: float):
         """更新 RTT 估计"""
         if sample_rtt <= 0:
-            logger.warning(f"忽略非法 RTT 样本: {sample_rtt}")
+            logger.warning("忽略非法 RTT 样本: %s", sample_rtt)
             return
         
         self.latest_rtt = sample_rtt
@@ -269,7 +338,7 @@ class QuicConnection:
         # 更新最小 RTT
         if self.min_rtt == float('inf') or sample_rtt < self.min_rtt:
             self.min_rtt = sample_rtt
-            logger.debug(f"更新最小 RTT: {self.min_rtt*1000:.2f} ms")
+            logger.debug("更新最小 RTT: %.2f ms", sample_rtt * 1000)
         
         # 初始化
         if self.smoothed_rtt == 0:
@@ -283,11 +352,10 @@ class QuicConnection:
             
             # 更新平滑 RTT
             self.smoothed_rtt = 0.875 * self.smoothed_rtt + 0.125 * sample_rtt
-            logger.debug(f"更新平滑 RTT: {self.smoothed_rtt*1000:.2f} ms")
+            logger.debug("更新平滑 RTT: %.2f ms", self.smoothed_rtt * 1000)
         
+        # 超出容量时 deque 自动丢弃最旧的样本
         self.rtt_samples.append(sample_rtt)
-        if len(self.rtt_samples) > 100:
-            self.rtt_samples.pop(0)
     
     def _handle_initial_packet(self, header, frames, addr):
         """处理 Initial 包"""
@@ -322,7 +390,7 @@ class QuicConnection:
         logger.info(f"收到 Handshake 包，源连接 ID: {header.source_connection_id.hex()}")
         
         # 设置连接为已建立
-        self.is_established = True
+        self.handshake_complete()
         
         # 如果是客户端，通知握手完成
         if self.is_client and self.transport and hasattr(self.transport, 'on_handshake_complete'):
@@ -334,13 +402,9 @@ class QuicConnection:
             logger.warning("收到 Short 包，但连接尚未建立")
             return
         
-        # 处理各种帧
-        for frame in frames:
-            # 根据帧类型处理
-            frame_type = type(frame).__name__
-            logger.debug(f"处理 {frame_type} 帧")
-            
-            # 后续这里应该添加对不同类型帧的处理，例如 PathChallengeFrame, PathResponseFrame 等
+        # 帧统一由传输层的帧处理表分派
+        if self.transport:
+            self.transport.dispatch_frames(frames, self, addr)
     
     def get_congestion_stats(self) -> dict:
         """获取拥塞控制统计信息"""
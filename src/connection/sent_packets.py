@@ -0,0 +1,106 @@
+from array import array
+from typing import Iterator, Optional, Tuple
+
+class SentPacketTable:
+    """在途数据包表
+
+    按结构数组存放: 发送时间、包大小和有效标志各占一个连续数组，下标为 packet_number - base。
+    包序号单调递增，确认或丢失后最早的无效项被跳过，空间不足时先整体前移再按倍数扩容。
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self._send_time = array('d', bytes(8 * capacity))
+        self._size = array('i', bytes(4 * capacity))
+        self._valid = bytearray(capacity)
+        self._base = 0   # 下标 0 对应的包序号
+        self._head = 0   # 最早的在途包下标
+        self._end = 0    # 已使用下标的上界
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
+
+    def __contains__(self, packet_number: int) -> bool:
+        index = packet_number - self._base
+        return 0 <= index < self._end and self._valid[index] == 1
+
+    def _reserve(self, index: int) -> int:
+        """确保下标可写，返回 (可能因前移而变化的) 下标"""
+        capacity = len(self._valid)
+        if index < capacity:
+            return index
+
+        # 先丢弃最早的已确认区域
+        head, end = self._head, self._end
+        if head:
+            count = end - head
+            self._send_time[:count] = self._send_time[head:end]
+            self._size[:count] = self._size[head:end]
+            self._valid[:count] = self._valid[head:end]
+            self._valid[count:end] = bytes(end - count)
+            self._base += head
+            self._end = count
+            self._head = 0
+            index -= head
+
+        # 仍然不够时按倍数扩容
+        if index >= capacity:
+            grow = max(capacity, index + 1 - capacity)
+            self._send_time.extend(array('d', bytes(8 * grow)))
+            self._size.extend(array('i', bytes(4 * grow)))
+            self._valid.extend(bytes(grow))
+        return index
+
+    def add(self, packet_number: int, send_time: float, size: int):
+        """记录一个已发送的包，包序号必须大于已记录的包序号"""
+        if not self._count:
+            # 表为空时直接从该包序号开始
+            self._base = packet_number
+            self._head = self._end = 0
+        index = packet_number - self._base
+        if index < self._end:
+            raise ValueError(f"包序号 {packet_number} 不是递增的")
+        index = self._reserve(index)
+        self._send_time[index] = send_time
+        self._size[index] = size
+        self._valid[index] = 1
+        self._end = index + 1
+        self._count += 1
+
+    def get(self, packet_number: int) -> Optional[Tuple[float, int]]:
+        """返回 (发送时间, 大小)，不存在时返回 None"""
+        index = packet_number - self._base
+        if 0 <= index < self._end and self._valid[index]:
+            return self._send_time[index], self._size[index]
+        return None
+
+    def pop(self, packet_number: int) -> Optional[Tuple[float, int]]:
+        """移除并返回 (发送时间, 大小)，不存在时返回 None"""
+        index = packet_number - self._base
+        if not (0 <= index < self._end and self._valid[index]):
+            return None
+        self._valid[index] = 0
+        self._count -= 1
+
+        # 跳过最早的已移除项
+        if index == self._head:
+            valid = self._valid
+            head, end = index + 1, self._end
+            while head < end and not valid[head]:
+                head += 1
+            self._head = head
+        return self._send_time[index], self._size[index]
+
+    def oldest(self) -> Optional[int]:
+        """最早的在途包序号"""
+        return self._base + self._head if self._count else None
+
+    def items(self) -> Iterator[Tuple[int, float, int]]:
+        """按包序号顺序遍历 (包序号, 发送时间, 大小)"""
+        valid, send_time, size, base = self._valid, self._send_time, self._size, self._base
+        for index in range(self._head, self._end):
+            if valid[index]:
+                yield base + index, send_time[index], size[index]
@@ -0,0 +1,57 @@
+import asyncio
+import collections
+import logging
+from typing import List
+from cryptography.hazmat.primitives.asymmetric import x25519
+
+logger = logging.getLogger("quic.crypto")
+
+class KeyPool:
+    """预生成的 X25519 私钥池
+
+    私钥在线程池中批量生成，新连接直接从池中取用，不在事件循环中调用 OpenSSL 生成密钥。
+    池为空或没有运行中的事件循环时同步生成。
+    """
+
+    def __init__(self, size: int = 32):
+        self.size = size
+        self._keys = collections.deque()
+        self._refilling = False
+
+    def get(self) -> x25519.X25519PrivateKey:
+        """取出一个私钥，并在需要时触发后台补充"""
+        try:
+            key = self._keys.popleft()
+        except IndexError:
+            key = x25519.X25519PrivateKey.generate()
+        self.refill()
+        return key
+
+    def refill(self):
+        """池中私钥不足一半时在线程池中补满"""
+        if self._refilling or len(self._keys) >= self.size // 2:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self._refilling = True
+        future = loop.run_in_executor(None, self._generate, self.size - len(self._keys))
+        future.add_done_callback(self._on_refilled)
+
+    @staticmethod
+    def _generate(count: int) -> List[x25519.X25519PrivateKey]:
+        return [x25519.X25519PrivateKey.generate() for _ in range(count)]
+
+    def _on_refilled(self, future: asyncio.Future):
+        self._refilling = False
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.warning(f"Failed to refill X25519 key pool: {future.exception()}")
+            return
+        self._keys.extend(future.result())
+
+# 进程内共享的私钥池
+key_pool = KeyPool()
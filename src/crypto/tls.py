@@ -7,6 +7,14 @@ from cryptography.hazmat.primitives.asymmetric import x25519
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 
+# HKDF 参数在所有连接间共享，每次握手只创建一次性的 HKDF 对象
+_HKDF_PARAMS = dict(
+    algorithm=hashes.SHA256(),
+    length=32,
+    salt=None,
+    info=b"quic key",
+)
+
 class TlsState(Enum):
     """TLS 状态"""
     INITIAL = 0
@@ -26,10 +34,11 @@ class TlsContext:
     # 密钥
     traffic_secret: Optional[bytes] = None
     
-    def __init__(self, is_client: bool):
+    def __init__(self, is_client: bool, private_key: Optional[x25519.X25519PrivateKey] = None):
         self.is_client = is_client
         self.state = TlsState.INITIAL
-        self.private_key = x25519.X25519PrivateKey.generate()
+        # 可传入预先生成的私钥 (见 keypool)，否则同步生成
+        self.private_key = private_key or x25519.X25519PrivateKey.generate()
     
     def get_public_key(self) -> bytes:
         """获取公钥字节"""
@@ -47,10 +56,4 @@ class TlsContext:
         shared_key = self.private_key.exchange(self.peer_public_key)
         
         # 使用 HKDF 派生密钥
-        hkdf = HKDF(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=None,
-            info=b"quic key",
-        )
-        self.traffic_secret = hkdf.derive(shared_key) 
\ No newline at end of file
+        self.traffic_secret = HKDF(**_HKDF_PARAMS).derive(shared_key) 
\ No newline at end of file
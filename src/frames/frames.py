@@ -1,28 +1,35 @@
+import struct
+
+# 格式只编译一次，避免每个帧重新解析格式字符串
+_RESP = struct.Struct('>QQI')
+_HDR = struct.Struct('>I')
+
 class FileResponseFrame:
     """文件响应帧"""
     def __init__(self, file_size: int, chunk_size: int, total_chunks: int = None):
         self.file_size = file_size
         self.chunk_size = chunk_size
-        self.total_chunks = total_chunks or math.ceil(file_size / chunk_size)
-        
+        # 整数向上取整，避免大文件在浮点除法中丢失精度
+        self.total_chunks = total_chunks if total_chunks is not None else -(-file_size // chunk_size)
+
     def to_bytes(self) -> bytes:
-        return struct.pack('>QQI', self.file_size, self.chunk_size, self.total_chunks)
-        
+        return _RESP.pack(self.file_size, self.chunk_size, self.total_chunks)
+
     @classmethod
     def from_bytes(cls, data: bytes) -> 'FileResponseFrame':
-        file_size, chunk_size, total_chunks = struct.unpack('>QQI', data)
-        return cls(file_size, chunk_size, total_chunks)
+        return cls(*_RESP.unpack_from(data))
 
 class FileDataFrame:
     """文件数据帧"""
     def __init__(self, chunk_id: int, data: bytes):
         self.chunk_id = chunk_id
         self.data = data
-        
+
     def to_bytes(self) -> bytes:
-        return struct.pack('>I', self.chunk_id) + self.data
-        
+        return _HDR.pack(self.chunk_id) + self.data
+
     @classmethod
     def from_bytes(cls, data: bytes) -> 'FileDataFrame':
-        chunk_id = struct.unpack('>I', data[:4])[0]
-        return cls(chunk_id, data[4:]) 
\ No newline at end of file
+        chunk_id, = _HDR.unpack_from(data, 0)
+        # 数据部分以 memoryview 引用，不复制块内容
+        return cls(chunk_id, memoryview(data)[_HDR.size:])
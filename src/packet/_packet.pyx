@@ -0,0 +1,64 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""SHORT 头部 + 单个 FILE_DATA 帧的数据包序列化 (Cython 加速版本)
+
+编译: cythonize -i src/packet/_packet.pyx
+未编译时 packet_processor 使用等价的纯 Python 实现。
+"""
+from cpython.bytes cimport PyBytes_AS_STRING
+from cpython.bytearray cimport PyByteArray_AS_STRING, PyByteArray_FromStringAndSize
+from libc.string cimport memcpy
+
+cdef enum:
+    PACKET_SHORT = 0x40
+    FRAME_FILE_DATA = 0x1e
+    # 帧总长度 (2) + 类型 (1) + 块序号 (4) + 数据长度 (4)
+    FILE_DATA_OVERHEAD = 11
+
+cdef inline void _put_u16(unsigned char* p, unsigned int v) noexcept nogil:
+    p[0] = (v >> 8) & 0xff
+    p[1] = v & 0xff
+
+cdef inline void _put_u32(unsigned char* p, unsigned int v) noexcept nogil:
+    p[0] = (v >> 24) & 0xff
+    p[1] = (v >> 16) & 0xff
+    p[2] = (v >> 8) & 0xff
+    p[3] = v & 0xff
+
+cdef inline Py_ssize_t _write_file_data(unsigned char* p, unsigned int chunk_id,
+                                        const unsigned char[:] data) except -1:
+    cdef Py_ssize_t n = data.shape[0]
+    if 9 + n > 0xffff:
+        raise ValueError("FILE_DATA 帧过大")
+    _put_u16(p, <unsigned int>(9 + n))
+    p[2] = FRAME_FILE_DATA
+    _put_u32(p + 3, chunk_id)
+    _put_u32(p + 7, <unsigned int>n)
+    if n:
+        memcpy(p + FILE_DATA_OVERHEAD, &data[0], n)
+    return FILE_DATA_OVERHEAD + n
+
+cpdef bytearray build_short_data_packet(bytes peer_cid, bytes cid, unsigned int chunk_id,
+                                    const unsigned char[:] data):
+    """构造 SHORT 头部 + 单个 FILE_DATA 帧的完整数据包"""
+    cdef Py_ssize_t dcid_len = len(peer_cid)
+    cdef Py_ssize_t scid_len = len(cid)
+    if dcid_len > 0xff or scid_len > 0xff:
+        raise ValueError("连接 ID 过长")
+    cdef Py_ssize_t header_len = 3 + dcid_len + scid_len
+    cdef bytearray out = PyByteArray_FromStringAndSize(NULL, header_len + FILE_DATA_OVERHEAD + data.shape[0])
+    cdef unsigned char* p = <unsigned char*>PyByteArray_AS_STRING(out)
+
+    p[0] = PACKET_SHORT
+    p[1] = <unsigned char>dcid_len
+    memcpy(p + 2, PyBytes_AS_STRING(peer_cid), dcid_len)
+    p[2 + dcid_len] = <unsigned char>scid_len
+    memcpy(p + 3 + dcid_len, PyBytes_AS_STRING(cid), scid_len)
+    _write_file_data(p + header_len, chunk_id, data)
+    return out
+
+cpdef Py_ssize_t pack_file_data(unsigned char[:] buf, Py_ssize_t offset, unsigned int chunk_id,
+                                const unsigned char[:] data) except -1:
+    """在已写入头部的缓冲区中原地写入单个 FILE_DATA 帧，返回数据包长度"""
+    if offset < 0 or offset + FILE_DATA_OVERHEAD + data.shape[0] > buf.shape[0]:
+        raise ValueError("缓冲区空间不足")
+    return offset + _write_file_data(&buf[offset], chunk_id, data)
@@ -1,107 +1,218 @@
-from enum import Enum
-from dataclasses import dataclass
-from typing import Optional
+from enum import IntEnum
+from typing import List, Optional, Tuple
+import struct
 
-class FrameType(Enum):
-    """QUIC 帧类型"""
-    PADDING = 0x00
-    PATH_CHALLENGE = 0x1a
-    PATH_RESPONSE = 0x1b
-    NEW_CONNECTION_ID = 0x18
-    FILE_REQUEST = 0x1c
-    FILE_RESPONSE = 0x1d
-    FILE_DATA = 0x1e
+# PATH_CHALLENGE / PATH_RESPONSE: 类型 (1) + 数据 (8, 按无符号 64 位整数处理)
+_PATH_FRAME = struct.Struct('>BQ')
+
+# ACK: 类型 (1) + 最大确认包序号 (4) + ACK 延迟 (4, 微秒) + 区间数量 (2)
+_ACK_FRAME = struct.Struct('>BIIH')
+# ACK 区间: 最小包序号 (4) + 最大包序号 (4)
+_ACK_RANGE = struct.Struct('>II')
+
+# NEW_CONNECTION_ID: 类型 (1) + 序列号 (2) + 连接 ID 长度 (1)
+_NEW_CONNECTION_ID = struct.Struct('>BHB')
+
+# FILE_REQUEST: 类型 (1) + 文件名长度 (2)
+_FILE_REQUEST = struct.Struct('>BH')
+# FILE_RESPONSE: 类型 (1) + 文件大小 (8) + 块大小 (4)
+_FILE_RESPONSE = struct.Struct('>BQI')
+# FILE_DATA: 类型 (1) + 块序号 (4) + 数据长度 (4)
+_FILE_DATA = struct.Struct('>BII')
+
+# 帧类型值，热路径直接使用 int 常量，不经过枚举属性查找
+FT_PADDING = 0x00
+FT_ACK = 0x02
+FT_PATH_CHALLENGE = 0x1a
+FT_PATH_RESPONSE = 0x1b
+FT_NEW_CONNECTION_ID = 0x18
+FT_FILE_REQUEST = 0x1c
+FT_FILE_RESPONSE = 0x1d
+FT_FILE_DATA = 0x1e
+
+class FrameType(IntEnum):
+    """QUIC 帧类型，与 FT_* 常量相等"""
+    PADDING = FT_PADDING
+    ACK = FT_ACK
+    PATH_CHALLENGE = FT_PATH_CHALLENGE
+    PATH_RESPONSE = FT_PATH_RESPONSE
+    NEW_CONNECTION_ID = FT_NEW_CONNECTION_ID
+    FILE_REQUEST = FT_FILE_REQUEST
+    FILE_RESPONSE = FT_FILE_RESPONSE
+    FILE_DATA = FT_FILE_DATA
 
-@dataclass
 class Frame:
-    """QUIC 帧基类"""
-    type: FrameType
+    """QUIC 帧基类
+    
+    帧在收发路径上大量创建，各子类使用 __slots__ 而不是 dataclass，实例不带 __dict__。
+    """
+    __slots__ = ('type',)
+    type: int  # FT_* 帧类型值
+    
+    def __init__(self, type: int):
+        self.type = type
+    
+    def byte_length(self) -> int:
+        """序列化后的长度 (字节)"""
+        raise NotImplementedError
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        """从 offset 处写入 buf，返回写入后的偏移"""
+        raise NotImplementedError
+    
+    def to_bytes(self) -> bytes:
+        buf = bytearray(self.byte_length())
+        self.to_buffer(buf, 0)
+        return bytes(buf)
+
+class AckFrame(Frame):
+    """ACK 帧"""
+    __slots__ = ('largest_acked', 'ack_delay', 'ranges')
+    largest_acked: int
+    ack_delay: int  # 微秒
+    ranges: List[Tuple[int, int]]  # (最小包序号, 最大包序号)，闭区间，从大到小排列
+    
+    def __init__(self, largest_acked: int, ack_delay: int, ranges: List[Tuple[int, int]]):
+        self.type = FT_ACK
+        self.largest_acked = largest_acked
+        self.ack_delay = ack_delay
+        self.ranges = ranges
+    
+    def byte_length(self) -> int:
+        return _ACK_FRAME.size + _ACK_RANGE.size * len(self.ranges)
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        _ACK_FRAME.pack_into(buf, offset, self.type, self.largest_acked,
+                             self.ack_delay, len(self.ranges))
+        offset += _ACK_FRAME.size
+        for smallest, largest in self.ranges:
+            _ACK_RANGE.pack_into(buf, offset, smallest, largest)
+            offset += _ACK_RANGE.size
+        return offset
+
+def _path_data(data, name: str) -> int:
+    """PATH_* 帧数据统一为 uint64，兼容传入 8 字节的 bytes"""
+    if isinstance(data, int):
+        if not 0 <= data < 1 << 64:
+            raise ValueError(f"{name} 数据必须是 8 字节")
+        return data
+    if len(data) != 8:
+        raise ValueError(f"{name} 数据必须是 8 字节")
+    return int.from_bytes(data, "big")
 
-@dataclass
 class PathChallengeFrame(Frame):
-    """PATH_CHALLENGE 帧"""
-    data: bytes  # 8 字节的随机数据
+    """PATH_CHALLENGE 帧
     
-    def __init__(self, data: bytes):
-        super().__init__(FrameType.PATH_CHALLENGE)
-        if len(data) != 8:
-            raise ValueError("PATH_CHALLENGE 数据必须是 8 字节")
-        self.data = data
+    8 字节数据以 int 保存，作为字典键时哈希和比较不需要处理 bytes 对象。
+    """
+    __slots__ = ('data',)
+    data: int  # 8 字节随机数据的大端整数值
     
-    def to_bytes(self) -> bytes:
-        return bytes([self.type.value]) + self.data
+    def __init__(self, data):
+        self.type = FT_PATH_CHALLENGE
+        self.data = _path_data(data, "PATH_CHALLENGE")
+    
+    def byte_length(self) -> int:
+        return _PATH_FRAME.size
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        _PATH_FRAME.pack_into(buf, offset, self.type, self.data)
+        return offset + _PATH_FRAME.size
 
-@dataclass
 class PathResponseFrame(Frame):
     """PATH_RESPONSE 帧"""
-    data: bytes  # 对应 PATH_CHALLENGE 的数据
+    __slots__ = ('data',)
+    data: int  # 对应 PATH_CHALLENGE 的数据
     
-    def __init__(self, data: bytes):
-        super().__init__(FrameType.PATH_RESPONSE)
-        if len(data) != 8:
-            raise ValueError("PATH_RESPONSE 数据必须是 8 字节")
-        self.data = data
+    def __init__(self, data):
+        self.type = FT_PATH_RESPONSE
+        self.data = _path_data(data, "PATH_RESPONSE")
     
-    def to_bytes(self) -> bytes:
-        return bytes([self.type.value]) + self.data
+    def byte_length(self) -> int:
+        return _PATH_FRAME.size
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        _PATH_FRAME.pack_into(buf, offset, self.type, self.data)
+        return offset + _PATH_FRAME.size
 
-@dataclass
 class NewConnectionIdFrame(Frame):
     """NEW_CONNECTION_ID 帧"""
+    __slots__ = ('sequence_number', 'connection_id')
     sequence_number: int
     connection_id: bytes
     
     def __init__(self, sequence_number: int, connection_id: bytes):
-        super().__init__(FrameType.NEW_CONNECTION_ID)
+        self.type = FT_NEW_CONNECTION_ID
         self.sequence_number = sequence_number
         self.connection_id = connection_id
     
-    def to_bytes(self) -> bytes:
-        result = bytearray([self.type.value])
-        # 序列号
-        result.extend(self.sequence_number.to_bytes(2, "big"))
-        # 连接 ID
-        result.append(len(self.connection_id))
-        result.extend(self.connection_id)
-        return bytes(result) 
+    def byte_length(self) -> int:
+        return _NEW_CONNECTION_ID.size + len(self.connection_id)
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        cid_length = len(self.connection_id)
+        _NEW_CONNECTION_ID.pack_into(buf, offset, self.type, self.sequence_number, cid_length)
+        start = offset + _NEW_CONNECTION_ID.size
+        end = start + cid_length
+        buf[start:end] = self.connection_id
+        return end
 
-@dataclass
 class FileRequestFrame(Frame):
     """文件请求帧"""
+    __slots__ = ('filename',)
     filename: str
     
     def __init__(self, filename: str):
-        super().__init__(FrameType.FILE_REQUEST)
+        self.type = FT_FILE_REQUEST
         self.filename = filename
     
-    def to_bytes(self) -> bytes:
+    def byte_length(self) -> int:
+        return _FILE_REQUEST.size + len(self.filename.encode('utf-8'))
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
         filename_bytes = self.filename.encode('utf-8')
-        return bytes([self.type.value]) + len(filename_bytes).to_bytes(2, 'big') + filename_bytes
+        _FILE_REQUEST.pack_into(buf, offset, self.type, len(filename_bytes))
+        start = offset + _FILE_REQUEST.size
+        end = start + len(filename_bytes)
+        buf[start:end] = filename_bytes
+        return end
 
-@dataclass
 class FileResponseFrame(Frame):
     """文件响应帧"""
+    __slots__ = ('file_size', 'chunk_size')
     file_size: int
-    chunk_size: int = 8192  # 默认块大小
+    chunk_size: int  # 默认 8192
     
     def __init__(self, file_size: int, chunk_size: int = 8192):
-        super().__init__(FrameType.FILE_RESPONSE)
+        self.type = FT_FILE_RESPONSE
         self.file_size = file_size
         self.chunk_size = chunk_size
     
-    def to_bytes(self) -> bytes:
-        return bytes([self.type.value]) + self.file_size.to_bytes(8, 'big') + self.chunk_size.to_bytes(4, 'big')
+    def byte_length(self) -> int:
+        return _FILE_RESPONSE.size
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        _FILE_RESPONSE.pack_into(buf, offset, self.type, self.file_size, self.chunk_size)
+        return offset + _FILE_RESPONSE.size
 
-@dataclass
 class FileDataFrame(Frame):
     """文件数据帧"""
+    __slots__ = ('chunk_id', 'data')
     chunk_id: int
-    data: bytes
+    data: bytes  # 接收路径上为数据报缓冲区的 memoryview 切片
     
     def __init__(self, chunk_id: int, data: bytes):
-        super().__init__(FrameType.FILE_DATA)
+        self.type = FT_FILE_DATA
         self.chunk_id = chunk_id
         self.data = data
     
-    def to_bytes(self) -> bytes:
-        return bytes([self.type.value]) + self.chunk_id.to_bytes(4, 'big') + len(self.data).to_bytes(4, 'big') + self.data 
\ No newline at end of file
+    def byte_length(self) -> int:
+        return _FILE_DATA.size + len(self.data)
+    
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        data_length = len(self.data)
+        _FILE_DATA.pack_into(buf, offset, self.type, self.chunk_id, data_length)
+        start = offset + _FILE_DATA.size
+        end = start + data_length
+        buf[start:end] = self.data
+        return end 
\ No newline at end of file
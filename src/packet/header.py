@@ -1,11 +1,21 @@
 from enum import Enum
 from dataclasses import dataclass
+import hashlib
+import itertools
 import os
+import struct
 from typing import Tuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 连接 ID = 带密钥的 BLAKE2b(计数器)，进程启动时取一次随机密钥，之后不再调用 os.urandom
+_CID_KEY = os.urandom(16)
+_cid_counter = itertools.count()
+
+# 包类型 (1) + 目标连接 ID 长度 (1)
+_HEADER_PREFIX = struct.Struct('>BB')
+
 class PacketType(Enum):
     """QUIC 数据包类型"""
     INITIAL = 0x0
@@ -22,8 +32,10 @@ class Header:
     @staticmethod
     def generate_connection_id() -> bytes:
         """生成一个新的连接 ID"""
-        cid = os.urandom(8)  # 使用 8 字节长度的 CID
-        logger.info(f"Generated new Connection ID: {cid.hex()}")
+        # 使用 8 字节长度的 CID，不可预测且在进程内唯一
+        counter = next(_cid_counter)
+        cid = hashlib.blake2b(counter.to_bytes(8, 'big'), key=_CID_KEY, digest_size=8).digest()
+        logger.debug("Generated new Connection ID: %s", cid.hex())
         return cid
 
     @staticmethod
@@ -32,11 +44,10 @@ class Header:
         if len(data) < 2:
             raise ValueError("数据太短")
             
-        packet_type = PacketType(data[0])
-        pos = 1
+        type_value, dcid_len = _HEADER_PREFIX.unpack_from(data, 0)
+        packet_type = PacketType(type_value)
+        pos = 2
         
-        dcid_len = data[pos]
-        pos += 1
         destination_connection_id = data[pos:pos+dcid_len]
         pos += dcid_len
         
@@ -45,19 +56,34 @@ class Header:
         source_connection_id = data[pos:pos+scid_len]
         pos += scid_len
         
-        logger.debug(f"Parsed header with CIDs - Source: {source_connection_id.hex()}, "
-                    f"Destination: {destination_connection_id.hex()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed header with CIDs - Source: %s, Destination: %s",
+                         source_connection_id.hex(), destination_connection_id.hex())
         
         return Header(packet_type, destination_connection_id, source_connection_id), pos
 
+    def byte_length(self) -> int:
+        """序列化后的长度 (字节)"""
+        return 3 + len(self.destination_connection_id) + len(self.source_connection_id)
+
+    def to_buffer(self, buf: bytearray, offset: int) -> int:
+        """从 offset 处写入 buf，返回写入后的偏移；连接 ID 直接从原 bytes 对象复制"""
+        dcid = self.destination_connection_id
+        scid = self.source_connection_id
+        _HEADER_PREFIX.pack_into(buf, offset, self.packet_type.value, len(dcid))
+        offset += _HEADER_PREFIX.size
+        buf[offset:offset + len(dcid)] = dcid
+        offset += len(dcid)
+        buf[offset] = len(scid)
+        offset += 1
+        buf[offset:offset + len(scid)] = scid
+        return offset + len(scid)
+
     def to_bytes(self) -> bytes:
         """将头部转换为字节"""
-        result = bytearray()
-        result.extend([self.packet_type.value])
-        result.extend(len(self.destination_connection_id).to_bytes(1, "big"))
-        result.extend(self.destination_connection_id)
-        result.extend(len(self.source_connection_id).to_bytes(1, "big"))
-        result.extend(self.source_connection_id)
-        logger.debug(f"Serialized header with CIDs - Source: {self.source_connection_id.hex()}, "
-                    f"Destination: {self.destination_connection_id.hex()}")
+        result = bytearray(self.byte_length())
+        self.to_buffer(result, 0)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Serialized header with CIDs - Source: %s, Destination: %s",
+                         self.source_connection_id.hex(), self.destination_connection_id.hex())
         return bytes(result) 
\ No newline at end of file
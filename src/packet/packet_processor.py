@@ -1,73 +1,204 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from .header import Header, PacketType
-from .frame import Frame, FrameType, PathChallengeFrame, PathResponseFrame, FileRequestFrame, FileResponseFrame, FileDataFrame
+from .frame import (Frame, AckFrame, PathChallengeFrame, PathResponseFrame, NewConnectionIdFrame,
+                    FileRequestFrame, FileResponseFrame, FileDataFrame,
+                    FT_ACK, FT_FILE_DATA, FT_FILE_REQUEST, FT_FILE_RESPONSE, FT_NEW_CONNECTION_ID,
+                    FT_PATH_CHALLENGE, FT_PATH_RESPONSE)
 import logging
+import struct
 
 logger = logging.getLogger("quic.packet")
 
+# 帧总长度
+_FRAMES_LENGTH = struct.Struct('>H')
+
+# 帧总长度 (2) + FILE_DATA 帧头: 类型 (1) + 块序号 (4) + 数据长度 (4)
+_FILE_DATA_PREFIX = struct.Struct('>HBII')
+
+# 解析时使用的帧字段 (不含类型字节)，unpack_from 直接在原数据上读取，不切片
+_FILE_REQ_LEN = struct.Struct('>H')
+_FILE_RESP = struct.Struct('>QI')
+_FILE_DATA_HDR = struct.Struct('>II')
+_ACK_HDR = struct.Struct('>IIH')
+_ACK_RANGE = struct.Struct('>II')
+_NEW_CID_HDR = struct.Struct('>HB')
+_U64 = struct.Struct('>Q')
+
+def _py_pack_file_data(buf, offset: int, chunk_id: int, data: bytes) -> int:
+    """在已写入头部的缓冲区中原地写入单个 FILE_DATA 帧，返回数据包长度
+    
+    与 create_packet(header, [FileDataFrame(chunk_id, data)]) 的结果一致，
+    但不创建帧对象和中间字节串。
+    """
+    data_length = len(data)
+    _FILE_DATA_PREFIX.pack_into(buf, offset, 9 + data_length,
+                                FT_FILE_DATA, chunk_id, data_length)
+    start = offset + _FILE_DATA_PREFIX.size
+    end = start + data_length
+    buf[start:end] = data
+    return end
+
+def _py_build_short_data_packet(peer_cid: bytes, cid: bytes, chunk_id: int, data: bytes) -> bytearray:
+    """构造 SHORT 头部 + 单个 FILE_DATA 帧的完整数据包"""
+    header = Header(PacketType.SHORT, peer_cid, cid)
+    buf = bytearray(header.byte_length() + _FILE_DATA_PREFIX.size + len(data))
+    header_len = header.to_buffer(buf, 0)
+    _py_pack_file_data(buf, header_len, chunk_id, data)
+    return buf
+
+try:
+    # 可选的 Cython 加速实现，见 _packet.pyx
+    from ._packet import build_short_data_packet, pack_file_data
+except ImportError:
+    build_short_data_packet = _py_build_short_data_packet
+    pack_file_data = _py_pack_file_data
+
+def _parse_file_request(data: bytes, pos: int):
+    filename_length, = _FILE_REQ_LEN.unpack_from(data, pos)
+    pos += 2
+    filename = str(data[pos:pos+filename_length], 'utf-8')
+    return FileRequestFrame(filename), pos + filename_length
+
+def _parse_file_response(data: bytes, pos: int):
+    file_size, chunk_size = _FILE_RESP.unpack_from(data, pos)
+    return FileResponseFrame(file_size, chunk_size), pos + 12
+
+def _parse_file_data(data: bytes, pos: int):
+    chunk_id, data_length = _FILE_DATA_HDR.unpack_from(data, pos)
+    pos += 8
+    end = pos + data_length
+    return FileDataFrame(chunk_id, data[pos:end]), end
+
+def _parse_path_challenge(data: bytes, pos: int):
+    if pos + 8 > len(data):
+        raise ValueError("PATH_CHALLENGE frame too short")
+    return PathChallengeFrame(_U64.unpack_from(data, pos)[0]), pos + 8
+
+def _parse_path_response(data: bytes, pos: int):
+    if pos + 8 > len(data):
+        raise ValueError("PATH_RESPONSE frame too short")
+    return PathResponseFrame(_U64.unpack_from(data, pos)[0]), pos + 8
+
+def _parse_new_connection_id(data: bytes, pos: int):
+    sequence_number, cid_length = _NEW_CID_HDR.unpack_from(data, pos)
+    pos += 3
+    end = pos + cid_length
+    if end > len(data):
+        raise ValueError("NEW_CONNECTION_ID frame too short")
+    # 连接 ID 用作字典键，转为 bytes 而不保留 memoryview
+    return NewConnectionIdFrame(sequence_number, bytes(data[pos:end])), end
+
+def _parse_ack(data: bytes, pos: int):
+    if pos + 10 > len(data):
+        raise ValueError("ACK frame too short")
+    largest_acked, ack_delay, range_count = _ACK_HDR.unpack_from(data, pos)
+    pos += 10
+    if pos + 8 * range_count > len(data):
+        raise ValueError("ACK frame too short")
+    ranges = []
+    for _ in range(range_count):
+        ranges.append(_ACK_RANGE.unpack_from(data, pos))
+        pos += 8
+    return AckFrame(largest_acked, ack_delay, ranges), pos
+
+# 帧类型字节 -> 解析函数 (data, pos) -> (frame, new_pos)，pos 指向类型字节之后
+_FRAME_PARSERS = {
+    FT_FILE_REQUEST: _parse_file_request,
+    FT_FILE_RESPONSE: _parse_file_response,
+    FT_FILE_DATA: _parse_file_data,
+    FT_PATH_CHALLENGE: _parse_path_challenge,
+    FT_PATH_RESPONSE: _parse_path_response,
+    FT_NEW_CONNECTION_ID: _parse_new_connection_id,
+    FT_ACK: _parse_ack,
+}
+
 class PacketProcessor:
     """QUIC 数据包处理器"""
     
+    # 单个 FILE_DATA 帧的数据包在头部之外的固定开销
+    FILE_DATA_OVERHEAD = _FILE_DATA_PREFIX.size
+    
+    # 在已写入头部的缓冲区中原地写入单个 FILE_DATA 帧，返回数据包长度
+    pack_file_data = staticmethod(pack_file_data)
+    
     @staticmethod
-    def parse_frames(data: bytes) -> List[Frame]:
-        """解析数据包中的帧"""
+    def parse_frames(data: bytes, start: int = 0, end: Optional[int] = None) -> List[Frame]:
+        """解析 data[start:end] 中的帧
+        
+        直接按偏移在原数据上解析，调用方无需先切出帧区域。data 可以是 memoryview，
+        此时 FILE_DATA 的数据为原缓冲区上的 memoryview 切片，不复制。
+        """
         frames = []
-        pos = 0
+        append = frames.append
+        parsers = _FRAME_PARSERS
+        unpack_data_header = _FILE_DATA_HDR.unpack_from
+        pos = start
+        if end is None or end > len(data):
+            end = len(data)
         
-        while pos < len(data):
+        while pos < end:
             frame_type = data[pos]
             pos += 1
-            
-            if frame_type == FrameType.FILE_REQUEST.value:
-                filename_length = int.from_bytes(data[pos:pos+2], 'big')
-                pos += 2
-                filename = data[pos:pos+filename_length].decode('utf-8')
-                pos += filename_length
-                frames.append(FileRequestFrame(filename))
-                
-            elif frame_type == FrameType.FILE_RESPONSE.value:
-                file_size = int.from_bytes(data[pos:pos+8], 'big')
-                chunk_size = int.from_bytes(data[pos+8:pos+12], 'big')
-                pos += 12
-                frames.append(FileResponseFrame(file_size, chunk_size))
-                
-            elif frame_type == FrameType.FILE_DATA.value:
-                chunk_id = int.from_bytes(data[pos:pos+4], 'big')
-                data_length = int.from_bytes(data[pos+4:pos+8], 'big')
-                pos += 8
-                chunk_data = data[pos:pos+data_length]
-                pos += data_length
-                frames.append(FileDataFrame(chunk_id, chunk_data))
-                
-            elif frame_type == FrameType.PATH_CHALLENGE.value:
-                if pos + 8 > len(data):
-                    raise ValueError("PATH_CHALLENGE frame too short")
-                challenge_data = data[pos:pos+8]
-                frames.append(PathChallengeFrame(challenge_data))
-                pos += 8
-                
-            elif frame_type == FrameType.PATH_RESPONSE.value:
-                if pos + 8 > len(data):
-                    raise ValueError("PATH_RESPONSE frame too short")
-                response_data = data[pos:pos+8]
-                frames.append(PathResponseFrame(response_data))
-                pos += 8
-                
-            # TODO: 添加其他帧类型的处理
+            if frame_type == FT_FILE_DATA:
+                # 连续的 FILE_DATA 帧在此内联解析，不经过分派表和函数调用
+                while True:
+                    chunk_id, data_length = unpack_data_header(data, pos)
+                    pos += 8
+                    chunk_end = pos + data_length
+                    if chunk_end > end:
+                        chunk_end = end
+                    append(FileDataFrame(chunk_id, data[pos:chunk_end]))
+                    pos = chunk_end
+                    if pos >= end or data[pos] != FT_FILE_DATA:
+                        break
+                    pos += 1
+                continue
+            parser = parsers.get(frame_type)
+            if parser is None:
+                # TODO: 添加其他帧类型的处理
+                continue
+            frame, pos = parser(data, pos)
+            append(frame)
             
         return frames
     
     @staticmethod
-    def create_packet(header: Header, frames: List[Frame]) -> bytes:
-        """创建完整的数据包"""
-        result = bytearray(header.to_bytes())
+    def parse_packet(data: bytes) -> Tuple[Header, List[Frame]]:
+        """解析完整的数据包，返回 (头部, 帧列表)"""
+        header, pos = Header.parse(data)
+        if len(data) - pos < _FRAMES_LENGTH.size:
+            # 没有帧区域，例如握手包
+            return header, []
+        frames_length, = _FRAMES_LENGTH.unpack_from(data, pos)
+        pos += _FRAMES_LENGTH.size
+        return header, PacketProcessor.parse_frames(memoryview(data), pos, pos + frames_length)
+    
+    @staticmethod
+    def create_packet(header: Header, frames: List[Frame]) -> bytearray:
+        """创建完整的数据包
+        
+        所有路径 (包括 SHORT + FILE_DATA 快速路径) 都返回 bytearray，
+        可直接交给 sendto/sendmmsg，不再额外复制为 bytes。
+        """
+        # 数据传输路径: SHORT 头部 + 单个 FILE_DATA 帧
+        if (header.packet_type is PacketType.SHORT and len(frames) == 1
+                and type(frames[0]) is FileDataFrame):
+            frame = frames[0]
+            return build_short_data_packet(header.destination_connection_id,
+                                           header.source_connection_id,
+                                           frame.chunk_id, frame.data)
+        
+        # 先由各帧字段算出总长度，缓冲区只分配一次，头部和各帧直接写入其中
+        frames_length = sum(frame.byte_length() for frame in frames)
+        result = bytearray(header.byte_length() + _FRAMES_LENGTH.size + frames_length)
+        offset = header.to_buffer(result, 0)
         
         # 添加所有帧的长度
-        frames_length = sum(len(frame.to_bytes()) for frame in frames)
-        result.extend(frames_length.to_bytes(2, "big"))
+        _FRAMES_LENGTH.pack_into(result, offset, frames_length)
+        offset += _FRAMES_LENGTH.size
         
         # 添加所有帧
         for frame in frames:
-            result.extend(frame.to_bytes())
+            offset = frame.to_buffer(result, offset)
         
-        return bytes(result) 
\ No newline at end of file
+        return result
@@ -0,0 +1,107 @@
+import asyncio
+import collections
+import logging
+import socket
+from typing import Optional
+
+from .mmsg import RecvBatch
+
+logger = logging.getLogger("quic.transport")
+
+# 自行持有 UDP 套接字的数据报传输层: 读事件通过公开的 loop.add_reader 注册，
+# 每次可读用 recvmmsg 批量接收；接口与 asyncio 的数据报传输层一致
+
+class BatchDatagramTransport(asyncio.DatagramTransport):
+    """用 recvmmsg 批量接收的数据报传输层"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sock: socket.socket,
+                 protocol: asyncio.DatagramProtocol, recv_batch: RecvBatch):
+        super().__init__({'socket': sock, 'sockname': sock.getsockname()})
+        self._loop = loop
+        self._sock = sock
+        self._fd = sock.fileno()
+        self._protocol = protocol
+        self._recv_batch = recv_batch
+        # 内核暂时不接受 (EAGAIN) 的数据报，套接字可写时按顺序补发
+        self._buffer = collections.deque()
+        self._buffer_size = 0
+        self._closing = False
+        # 不支持 add_reader 的事件循环 (如 Proactor) 在这里抛出 NotImplementedError
+        loop.add_reader(self._fd, self._read_ready)
+        loop.call_soon(protocol.connection_made, self)
+
+    def _read_ready(self):
+        """套接字可读: 批量接收并逐个交给 datagram_received"""
+        try:
+            datagrams = self._recv_batch.recv(self._fd)
+        except OSError as e:
+            # 与 asyncio 相同，ICMP 错误等交给 error_received，不影响后续接收
+            self._protocol.error_received(e)
+            return
+        datagram_received = self._protocol.datagram_received
+        for data, addr in datagrams:
+            datagram_received(data, addr)
+
+    def sendto(self, data, addr=None):
+        if self._closing:
+            return
+        if not self._buffer:
+            try:
+                self._sock.sendto(data, addr)
+                return
+            except (BlockingIOError, InterruptedError):
+                self._loop.add_writer(self._fd, self._write_ready)
+            except OSError as e:
+                self._protocol.error_received(e)
+                return
+        self._buffer.append((bytes(data), addr))
+        self._buffer_size += len(data)
+
+    def _write_ready(self):
+        """套接字可写: 按顺序补发缓冲的数据报"""
+        buffer = self._buffer
+        while buffer:
+            data, addr = buffer[0]
+            try:
+                self._sock.sendto(data, addr)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._protocol.error_received(e)
+            buffer.popleft()
+            self._buffer_size -= len(data)
+        self._loop.remove_writer(self._fd)
+        if self._closing:
+            self._loop.call_soon(self._call_connection_lost)
+
+    def get_write_buffer_size(self) -> int:
+        return self._buffer_size
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        # 与 asyncio 一致: 缓冲的数据报发完后再关闭套接字
+        if not self._buffer:
+            self._loop.call_soon(self._call_connection_lost)
+
+    def abort(self):
+        if self._closing and not self._buffer:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        if self._buffer:
+            self._loop.remove_writer(self._fd)
+            self._buffer.clear()
+            self._buffer_size = 0
+        self._loop.call_soon(self._call_connection_lost)
+
+    def _call_connection_lost(self, exc: Optional[Exception] = None):
+        try:
+            self._protocol.connection_lost(exc)
+        finally:
+            self._sock.close()
@@ -0,0 +1,190 @@
+import ctypes
+import ctypes.util
+import errno
+import socket
+import struct
+import sys
+from typing import List, Tuple
+
+# Linux sendmmsg(2) / recvmmsg(2) 的 ctypes 封装，用于一次系统调用收发多个数据报
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+def _load_libc_function(name: str, argtypes: list):
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = argtypes
+    func.restype = ctypes.c_int
+    return func
+
+_sendmmsg = _load_libc_function(
+    "sendmmsg", [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int])
+_recvmmsg = _load_libc_function(
+    "recvmmsg", [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p])
+HAVE_SENDMMSG = _sendmmsg is not None
+HAVE_RECVMMSG = _recvmmsg is not None
+
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+MSG_TRUNC = getattr(socket, 'MSG_TRUNC', 0x20)
+_SOCKADDR_STORAGE_SIZE = 128
+
+def _sockaddr(addr: tuple) -> bytes:
+    """将 (host, port) 转换为 sockaddr_in / sockaddr_in6 结构"""
+    host, port = addr[0], addr[1]
+    try:
+        return (struct.pack("=H", socket.AF_INET) + struct.pack("!H", port)
+                + socket.inet_pton(socket.AF_INET, host) + bytes(8))
+    except OSError:
+        pass
+    flowinfo = addr[2] if len(addr) > 2 else 0
+    scope_id = addr[3] if len(addr) > 3 else 0
+    return (struct.pack("=H", socket.AF_INET6) + struct.pack("!HI", port, flowinfo)
+            + socket.inet_pton(socket.AF_INET6, host) + struct.pack("=I", scope_id))
+
+def _buffer_address(data, keepalive: list) -> int:
+    """获取数据缓冲区地址，只读缓冲区才需要复制"""
+    if isinstance(data, bytes):
+        ptr = ctypes.c_char_p(data)
+        keepalive.append(ptr)
+        return ctypes.cast(ptr, ctypes.c_void_p).value
+    try:
+        buf = (ctypes.c_char * len(data)).from_buffer(data)
+    except TypeError:
+        buf = (ctypes.c_char * len(data)).from_buffer_copy(data)
+    keepalive.append(buf)
+    return ctypes.addressof(buf)
+
+def sendmmsg(fd: int, datagrams: List[Tuple[bytes, tuple]]) -> int:
+    """通过 sendmmsg 批量发送数据报，返回已发送的数量
+
+    套接字缓冲区已满 (EAGAIN) 时提前返回，剩余数据报由调用方处理。
+    """
+    if not HAVE_SENDMMSG:
+        raise OSError(errno.ENOSYS, "sendmmsg is not available")
+
+    count = len(datagrams)
+    if count == 0:
+        return 0
+
+    keepalive = []
+    names = {}
+    iovecs = (_IoVec * count)()
+    msgs = (_MMsgHdr * count)()
+    for i, (data, addr) in enumerate(datagrams):
+        name = names.get(addr)
+        if name is None:
+            raw = _sockaddr(addr)
+            name = ctypes.create_string_buffer(raw, len(raw))
+            names[addr] = name
+        iovecs[i].iov_base = _buffer_address(data, keepalive)
+        iovecs[i].iov_len = len(data)
+        hdr = msgs[i].msg_hdr
+        hdr.msg_name = ctypes.addressof(name)
+        hdr.msg_namelen = ctypes.sizeof(name)
+        hdr.msg_iov = ctypes.pointer(iovecs[i])
+        hdr.msg_iovlen = 1
+
+    sent = 0
+    while sent < count:
+        n = _sendmmsg(fd, ctypes.byref(msgs[sent]), count - sent, 0)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                break
+            raise OSError(err, "sendmmsg: " + errno.errorcode.get(err, str(err)))
+        sent += n
+    return sent
+
+def _parse_sockaddr(raw: bytes) -> tuple:
+    """将 sockaddr_in / sockaddr_in6 结构转换为 (host, port[, flowinfo, scope_id])"""
+    family, = struct.unpack_from("=H", raw, 0)
+    if family == socket.AF_INET:
+        port, = struct.unpack_from("!H", raw, 2)
+        return socket.inet_ntop(socket.AF_INET, raw[4:8]), port
+    port, flowinfo = struct.unpack_from("!HI", raw, 2)
+    scope_id, = struct.unpack_from("=I", raw, 24)
+    return socket.inet_ntop(socket.AF_INET6, raw[8:24]), port, flowinfo, scope_id
+
+class RecvBatch:
+    """recvmmsg 的接收缓冲区，预先分配后在每次调用间复用
+
+    长于 bufsize 的数据报被内核截断，recv() 直接丢弃。
+    """
+
+    def __init__(self, count: int = 16, bufsize: int = 65536):
+        if not HAVE_RECVMMSG:
+            raise OSError(errno.ENOSYS, "recvmmsg is not available")
+        self.count = count
+        self.bufsize = bufsize
+        self._buffers = [ctypes.create_string_buffer(bufsize) for _ in range(count)]
+        self._names = [ctypes.create_string_buffer(_SOCKADDR_STORAGE_SIZE) for _ in range(count)]
+        self._iovecs = (_IoVec * count)()
+        self._msgs = (_MMsgHdr * count)()
+        self._buffer_addrs = [ctypes.addressof(buf) for buf in self._buffers]
+        self._name_addrs = [ctypes.addressof(name) for name in self._names]
+        for i in range(count):
+            self._iovecs[i].iov_base = self._buffer_addrs[i]
+            self._iovecs[i].iov_len = bufsize
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_name = self._name_addrs[i]
+
+    def recv(self, fd: int) -> List[Tuple[bytes, tuple]]:
+        """非阻塞地一次接收最多 count 个数据报，没有数据时返回空列表"""
+        msgs = self._msgs
+        for i in range(self.count):
+            msgs[i].msg_hdr.msg_namelen = _SOCKADDR_STORAGE_SIZE
+            msgs[i].msg_hdr.msg_flags = 0
+
+        while True:
+            n = _recvmmsg(fd, msgs, self.count, MSG_DONTWAIT, None)
+            if n >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return []
+            raise OSError(err, "recvmmsg: " + errno.errorcode.get(err, str(err)))
+
+        # string_at 只复制实际长度；.raw 会先复制整个缓冲区再切片
+        string_at = ctypes.string_at
+        buffer_addrs, name_addrs = self._buffer_addrs, self._name_addrs
+        result = []
+        for i in range(n):
+            msg = msgs[i]
+            if msg.msg_hdr.msg_flags & MSG_TRUNC:
+                # 数据报长于接收缓冲区，内容不完整
+                continue
+            addr = _parse_sockaddr(string_at(name_addrs[i], msg.msg_hdr.msg_namelen))
+            result.append((string_at(buffer_addrs[i], msg.msg_len), addr))
+        return result
@@ -1,38 +1,149 @@
 import asyncio
 import logging
-from typing import Optional, Callable, Dict
+import socket
+import struct
+from typing import Optional, Callable, Dict, List, Tuple
 from ..packet.header import Header, PacketType
 from ..packet.packet_processor import PacketProcessor
 from ..connection.connection import QuicConnection, Path
-from ..packet.frame import PathChallengeFrame, PathResponseFrame, FileRequestFrame, FileResponseFrame, FileDataFrame
+from ..packet.frame import (AckFrame, PathChallengeFrame, PathResponseFrame, NewConnectionIdFrame,
+                            FileRequestFrame, FileResponseFrame, FileDataFrame,
+                            FT_ACK, FT_FILE_DATA, FT_FILE_REQUEST, FT_FILE_RESPONSE, FT_NEW_CONNECTION_ID,
+                            FT_PATH_CHALLENGE, FT_PATH_RESPONSE)
 from ..crypto.tls import TlsContext
+from .mmsg import HAVE_SENDMMSG, HAVE_RECVMMSG, RecvBatch, sendmmsg
+from .endpoint import BatchDatagramTransport
 
 logger = logging.getLogger("quic.transport")
 
-class QuicTransport:
-    """QUIC UDP 传输层"""
+SOCKET_BUFFER_SIZE = 16 * 1024 * 1024  # 默认收发缓冲区大小 (bytes)
+
+RECV_BATCH_SIZE = 32  # 每次 recvmmsg 最多接收的数据报数
+# 接收缓冲区按协议中最大的数据报分配: 8KB 文件分块加上包头和帧头，留有余量；更长的数据报被丢弃
+RECV_BUFFER_SIZE = 9216
+
+# 帧中不携带文件名，客户端回调使用的默认文件名
+DEFAULT_FILENAME = "movie.mp4"
+
+# 负载开头的帧区域长度 (2)
+_FRAMES_LENGTH = struct.Struct('>H')
+
+CONNECTION_SHARDS = 16  # 连接表按连接 ID 首字节低 4 位分片
+
+class QuicTransport(asyncio.DatagramProtocol):
+    """QUIC UDP 传输层，同时作为 asyncio 数据报协议接收数据包"""
     
-    def __init__(self):
+    def __init__(self, connections: Optional[List[Dict[bytes, QuicConnection]]] = None):
         self.transport: Optional[asyncio.DatagramTransport] = None
-        self.connections: Dict[bytes, QuicConnection] = {}  # connection_id -> connection
+        # 分片的 connection_id -> connection 表，多个端点可共享同一个连接表
+        self.connections = connections if connections is not None else self.new_connection_table()
         self._local_addr: Optional[tuple[str, int]] = None
         self.on_handshake_complete = None  # 添加回调
         self.client = None  # 添加客户端引用
         self.server = None  # 添加服务器引用
+        # bind_client / bind_server 时取出的回调，收包路径上不再逐包 hasattr
+        self._handle_initial_packet: Optional[Callable] = None
+        self._handle_file_request: Optional[Callable] = None
+        self._handle_file_response: Optional[Callable] = None
+        self._handle_file_data: Optional[Callable] = None
+        # 本轮事件循环内由 send_datagram 排队的数据报，由 _flush_tx 合并发送
+        self._tx_queue: List[Tuple[bytes, tuple]] = []
+        # 帧类型 -> 处理方法 (frame, connection, addr)
+        self._frame_handlers = {
+            FT_PATH_CHALLENGE: self._on_path_challenge,
+            FT_PATH_RESPONSE: self._on_path_response,
+            FT_NEW_CONNECTION_ID: self._on_new_connection_id,
+            FT_FILE_REQUEST: self._on_file_request,
+            FT_FILE_RESPONSE: self._on_file_response,
+            FT_FILE_DATA: self._on_file_data,
+            FT_ACK: self._on_ack,
+        }
     
-    async def create_endpoint(self, host: str, port: int):
-        """创建 UDP 端点"""
-        loop = asyncio.get_running_loop()
+    @staticmethod
+    def new_connection_table() -> List[Dict[bytes, QuicConnection]]:
+        """创建分片连接表"""
+        return [{} for _ in range(CONNECTION_SHARDS)]
+    
+    def bind_client(self, client):
+        """关联客户端，并记录其文件响应/数据回调"""
+        self.client = client
+        self._handle_file_response = getattr(client, 'handle_file_response', None)
+        self._handle_file_data = getattr(client, 'handle_file_data', None)
+    
+    def bind_server(self, server):
+        """关联服务器，并记录其 Initial 包和文件请求回调"""
+        self.server = server
+        self._handle_initial_packet = getattr(server, 'handle_initial_packet', None)
+        self._handle_file_request = getattr(server, 'handle_file_request', None)
+    
+    def get_connection(self, connection_id: bytes) -> Optional[QuicConnection]:
+        """按连接 ID 查找连接"""
+        shard = connection_id[0] & 0xF if connection_id else 0
+        return self.connections[shard].get(connection_id)
+    
+    def add_connection(self, connection_id: bytes, connection: QuicConnection):
+        """登记连接"""
+        shard = connection_id[0] & 0xF if connection_id else 0
+        self.connections[shard][connection_id] = connection
+    
+    async def create_endpoint(self, host: str, port: int, reuse_port: bool = False):
+        """创建 UDP 端点
         
-        transport, _ = await loop.create_datagram_endpoint(
-            lambda: QuicDatagramProtocol(self),
-            local_addr=(host, port)
-        )
+        有 recvmmsg 时自行创建套接字，由 BatchDatagramTransport 通过 loop.add_reader 批量接收；
+        否则 (非 Linux、Proactor 事件循环等) 使用 asyncio 的数据报端点逐包接收。
+        """
+        loop = asyncio.get_running_loop()
+        transport = None
+        if HAVE_RECVMMSG:
+            transport = await self._create_batch_endpoint(loop, host, port, reuse_port)
+        if transport is None:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: self,
+                local_addr=(host, port),
+                reuse_port=reuse_port or None
+            )
         
         self.transport = transport
         self._local_addr = (host, port)
         logger.info(f"QUIC endpoint created on {host}:{port}")
     
+    async def _create_batch_endpoint(self, loop: asyncio.AbstractEventLoop, host: str, port: int,
+                                     reuse_port: bool) -> Optional[asyncio.DatagramTransport]:
+        """创建并绑定非阻塞 UDP 套接字，返回批量接收的传输层；事件循环不支持 add_reader 时返回 None"""
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM, flags=socket.AI_PASSIVE)
+        family, type_, proto, _, address = infos[0]
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.setblocking(False)
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(address)
+            transport = BatchDatagramTransport(loop, sock, self, RecvBatch(RECV_BATCH_SIZE, RECV_BUFFER_SIZE))
+        except NotImplementedError:
+            sock.close()
+            return None
+        except BaseException:
+            sock.close()
+            raise
+        # 与 create_datagram_endpoint 一致，返回前让 connection_made 先执行
+        await asyncio.sleep(0)
+        return transport
+    
+    def set_socket_buffers(self, size: int = SOCKET_BUFFER_SIZE):
+        """调整套接字收发缓冲区，返回内核实际生效的 (接收, 发送) 大小"""
+        sock = self.transport.get_extra_info('socket')
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, size)
+            except OSError as e:
+                logger.warning(f"Failed to set socket buffer option {option}: {e}")
+        
+        # 内核会按 rmem_max / wmem_max 截断，读回实际值
+        rcvbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        logger.info(f"Socket buffers: SO_RCVBUF={rcvbuf}, SO_SNDBUF={sndbuf} (requested {size})")
+        return rcvbuf, sndbuf
+    
     def connection_made(self, transport: asyncio.DatagramTransport):
         """连接建立回调"""
         self.transport = transport
@@ -42,26 +153,29 @@ class QuicTransport:
         try:
             # 解析包头
             header, consumed = Header.parse(data)
+            # 负载以 memoryview 传递，帧解析在原数据报上进行，不复制
+            payload = memoryview(data)[consumed:]
             
             
             # 查找或创建连接
-            connection = self.connections.get(header.destination_connection_id)
+            connection = self.get_connection(header.destination_connection_id)
             
             if connection is None:
                 if header.packet_type == PacketType.INITIAL:
                     # 新连接
                     connection = QuicConnection(header.destination_connection_id, is_client=False)
                     connection.transport = self
-                    self.connections[header.destination_connection_id] = connection
-                    logger.info(f"New connection from {addr}")
+                    self.add_connection(header.destination_connection_id, connection)
+                    logger.info("New connection from %s", addr)
                     
                     # 处理 Initial 包
-                    if hasattr(self, 'handle_initial_packet'):
+                    handle_initial = self._handle_initial_packet
+                    if handle_initial is not None:
                         asyncio.create_task(
-                            self.handle_initial_packet(connection, header, data[consumed:], addr)
+                            handle_initial(connection, header, payload, addr)
                         )
                 else:
-                    logger.warning(f"Received packet for unknown connection from {addr}")
+                    logger.warning("Received packet for unknown connection from %s", addr)
                     return
             else:
                 # 现有连接
@@ -71,6 +185,12 @@ class QuicTransport:
                     if self.on_handshake_complete:
                         self.on_handshake_complete()
                     return
+                if header.packet_type == PacketType.INITIAL and self._handle_initial_packet is not None:
+                    # 客户端重传的 Initial，说明之前的响应可能丢失，重新响应
+                    asyncio.create_task(
+                        self._handle_initial_packet(connection, header, payload, addr)
+                    )
+                    return
             
             # 更新路径信息
             if connection.active_path is None:
@@ -80,14 +200,14 @@ class QuicTransport:
                 self._handle_path_migration(connection, addr)
             
             # 处理数据包
-            self._process_packet(connection, data[consumed:], addr)
+            self._process_packet(connection, payload, addr)
             
         except Exception as e:
-            logger.error(f"Error processing packet from {addr}: {e}", exc_info=True)
+            logger.error("Error processing packet from %s: %s", addr, e, exc_info=True)
     
     def _handle_path_migration(self, connection: QuicConnection, new_addr: tuple[str, int]):
         """处理可能的路径迁移"""
-        logger.info(f"Potential path migration detected: {new_addr}")
+        logger.info("Potential path migration detected: %s", new_addr)
         
         # 创建新路径
         new_path = Path(self._local_addr, new_addr)
@@ -105,71 +225,121 @@ class QuicTransport:
             if len(payload) < 2:
                 return
             
-            frames_length = int.from_bytes(payload[:2], "big")
-            frames_data = payload[2:2+frames_length]
+            frames_length, = _FRAMES_LENGTH.unpack_from(payload, 0)
             
-            # 解析帧
-            frames = PacketProcessor.parse_frames(frames_data)
+            # 解析帧: 直接在负载上按偏移解析，不切出帧区域
+            frames = PacketProcessor.parse_frames(payload, 2, 2 + frames_length)
+            self.dispatch_frames(frames, connection, addr)
             
-            # 处理每个帧
-            for frame in frames:
-                if isinstance(frame, PathChallengeFrame):
-                    logger.info(f"Received PATH_CHALLENGE from {addr}")
-                    response = PathResponseFrame(frame.data)
-                    response_packet = PacketProcessor.create_packet(
-                        Header(
-                            PacketType.SHORT,
-                            connection.peer_connection_id,
-                            connection.connection_id
-                        ),
-                        [response]
-                    )
-                    self.send_datagram(response_packet, addr)
-                    
-                elif isinstance(frame, PathResponseFrame):
-                    logger.info(f"Received PATH_RESPONSE from {addr}")
-                    if frame.data in connection.pending_path_challenges:
-                        path = connection.pending_path_challenges[frame.data]
-                        path.is_validated = True
-                        if addr == path.peer_addr:
-                            connection.active_path = path
-                            logger.info(f"Path migration complete: {addr}")
-                
-                elif isinstance(frame, FileRequestFrame):
-                    # 处理文件请求
-                    logger.info(f"Received FILE_REQUEST for {frame.filename}")
-                    if hasattr(self.server, 'handle_file_request'):
-                        asyncio.create_task(self.server.handle_file_request(connection, frame, addr))
-                        
-                elif isinstance(frame, FileResponseFrame):
-                    # 处理文件响应
-                    logger.info(f"Received FILE_RESPONSE")
-                    if hasattr(self.client, 'handle_file_response'):
-                        self.client.handle_file_response(frame, "movie.mp4")  # 传入文件名
-                        
-                elif isinstance(frame, FileDataFrame):
-                    # 处理文件数据
-                    if hasattr(self.client, 'handle_file_data'):
-                        self.client.handle_file_data(frame, "movie.mp4")  # 传入文件名
-                        
         except Exception as e:
-            logger.error(f"Error processing packet: {e}")
+            logger.error("Error processing packet: %s", e)
     
-    def send_datagram(self, data: bytes, addr: tuple):
-        """发送数据报"""
-        if self.transport:
-            self.transport.sendto(data, addr)
-            return True
-        return False
-
-class QuicDatagramProtocol(asyncio.DatagramProtocol):
-    """QUIC UDP 协议处理"""
+    def dispatch_frames(self, frames: List, connection: QuicConnection, addr: tuple):
+        """按帧类型分派处理，接收路径上唯一的帧处理表"""
+        handlers = self._frame_handlers
+        for frame in frames:
+            handler = handlers.get(frame.type)
+            if handler is not None:
+                handler(frame, connection, addr)
     
-    def __init__(self, quic_transport: QuicTransport):
-        self.quic_transport = quic_transport
+    def _on_path_challenge(self, frame: PathChallengeFrame, connection: QuicConnection, addr: tuple):
+        """回应 PATH_CHALLENGE"""
+        logger.info("Received PATH_CHALLENGE from %s", addr)
+        response = PathResponseFrame(frame.data)
+        response_packet = PacketProcessor.create_packet(
+            Header(
+                PacketType.SHORT,
+                connection.peer_connection_id,
+                connection.connection_id
+            ),
+            [response]
+        )
+        self.send_datagram(response_packet, addr)
     
-    def connection_made(self, transport: asyncio.DatagramTransport):
-        self.quic_transport.connection_made(transport)
+    def _on_path_response(self, frame: PathResponseFrame, connection: QuicConnection, addr: tuple):
+        """PATH_RESPONSE 与挑战匹配时完成路径迁移"""
+        logger.info("Received PATH_RESPONSE from %s", addr)
+        path = connection.pending_path_challenges.pop(frame.data, None)
+        if path is None:
+            return
+        path.is_validated = True
+        if addr == path.peer_addr:
+            connection.active_path = path
+            logger.info("Path migration complete: %s", addr)
     
-    def datagram_received(self, data: bytes, addr: tuple[str, int]):
-        self.quic_transport.datagram_received(data, addr) 
\ No newline at end of file
+    def _on_new_connection_id(self, frame: NewConnectionIdFrame, connection: QuicConnection, addr: tuple):
+        """记录对端提供的新连接 ID"""
+        connection.peer_connection_ids[frame.sequence_number] = frame.connection_id
+    
+    def _on_file_request(self, frame: FileRequestFrame, connection: QuicConnection, addr: tuple):
+        """处理文件请求"""
+        logger.info("Received FILE_REQUEST for %s", frame.filename)
+        handle_file_request = self._handle_file_request
+        if handle_file_request is not None:
+            asyncio.create_task(handle_file_request(connection, frame, addr))
+    
+    def _on_file_response(self, frame: FileResponseFrame, connection: QuicConnection, addr: tuple):
+        """处理文件响应"""
+        logger.info("Received FILE_RESPONSE")
+        handle_file_response = self._handle_file_response
+        if handle_file_response is not None:
+            handle_file_response(frame, DEFAULT_FILENAME)
+    
+    def _on_file_data(self, frame: FileDataFrame, connection: QuicConnection, addr: tuple):
+        """处理文件数据"""
+        handle_file_data = self._handle_file_data
+        if handle_file_data is not None:
+            handle_file_data(frame, DEFAULT_FILENAME)
+    
+    def _on_ack(self, frame: AckFrame, connection: QuicConnection, addr: tuple):
+        """处理 ACK"""
+        connection.process_ack(frame)
+    
+    def send_datagram(self, data: bytes, addr: tuple):
+        """发送数据报
+        
+        数据报先进入发送队列，本轮事件循环结束前与同一轮的其他数据报一起经 sendmmsg 发出。
+        """
+        if not self.transport:
+            return False
+        if not self._tx_queue:
+            try:
+                asyncio.get_running_loop().call_soon(self._flush_tx)
+            except RuntimeError:
+                # 没有运行中的事件循环时直接发送
+                self.transport.sendto(data, addr)
+                return True
+        self._tx_queue.append((data, addr))
+        return True
+    
+    def _flush_tx(self):
+        """发送队列中的数据报"""
+        if self._tx_queue:
+            self.send_datagram_batch([])
+    
+    def send_datagram_batch(self, datagrams: List[Tuple[bytes, tuple]]):
+        """批量发送数据报，Linux 上通过 sendmmsg 合并系统调用"""
+        if not self.transport:
+            return False
+        
+        # 先发出 send_datagram 排队的数据报，保持发送顺序
+        if self._tx_queue:
+            datagrams = self._tx_queue + datagrams
+            self._tx_queue = []
+        if not datagrams:
+            return True
+        
+        sent = 0
+        # 传输层缓冲区中仍有待发数据时直接走 sendto，避免乱序
+        if not self.transport.get_write_buffer_size():
+            if HAVE_SENDMMSG:
+                sock = self.transport.get_extra_info('socket')
+                try:
+                    sent = sendmmsg(sock.fileno(), datagrams)
+                except OSError as e:
+                    logger.debug("sendmmsg failed, falling back to sendto: %s", e)
+        
+        # 未能发出的数据报交给 asyncio 传输层缓冲
+        for data, addr in datagrams[sent:]:
+            self.transport.sendto(data, addr)
+        return True
@@ -0,0 +1,42 @@
+import time
+import unittest
+
+from src.connection.connection import QuicConnection
+from src.packet.frame import AckFrame
+
+
+class MultiLossAckTest(unittest.TestCase):
+    """一个 ACK 同时揭示多个丢包"""
+
+    def setUp(self):
+        self.connection = QuicConnection(b'\x01' * 8, is_client=False)
+        self.cc = self.connection.congestion_control
+        send_time = time.time() - 0.05
+        for packet_number in range(10):
+            self.connection.sent_packets.add(packet_number, send_time, 1200)
+            self.cc.on_packet_sent(1200)
+        self.connection.next_packet_number = 10
+
+    def test_single_window_reduction(self):
+        initial_cwnd = self.cc.cwnd
+        # 只确认 9 号包: 0..6 号包超过包序号阈值，判定丢失
+        self.connection.process_ack(AckFrame(9, 0, [(9, 9)]))
+        self.assertEqual(self.cc.cwnd, int(initial_cwnd * self.cc.BETA_CUBIC))
+
+    def test_lost_packets_leave_flight(self):
+        self.connection.process_ack(AckFrame(9, 0, [(9, 9)]))
+        self.assertEqual(len(self.connection.sent_packets), 2)
+        self.assertEqual(self.cc.in_flight, 2)
+        self.assertTrue(self.cc.can_send_packet())
+
+    def test_loss_after_recovery_start_reduces_again(self):
+        self.connection.process_ack(AckFrame(9, 0, [(9, 9)]))
+        cwnd = self.cc.cwnd
+        # 恢复期开始之后发出的包丢失，开始新的拥塞事件
+        self.cc.on_packet_sent(1200)
+        self.cc.on_packet_lost(1200, time.time() + 1)
+        self.assertLess(self.cc.cwnd, cwnd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from client import QuicClient
+from server import HAVE_REUSEPORT, QuicServer
+from src.transport.udp import DEFAULT_FILENAME
+
+
+@unittest.skipUnless(HAVE_REUSEPORT, "SO_REUSEPORT is not available")
+class ReusePortTransferTest(unittest.IsolatedAsyncioTestCase):
+    """服务器使用多个 SO_REUSEPORT 套接字时完成文件传输"""
+
+    WORKERS = 2
+    CLIENTS = 4
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data = os.urandom(512 * 1024 + 123)
+        with open(os.path.join(self.tmpdir.name, DEFAULT_FILENAME), 'wb') as f:
+            f.write(self.data)
+
+        self.server = QuicServer('127.0.0.1', 0, self.tmpdir.name, workers=self.WORKERS)
+        # 测试中不查询公网 IP
+        self.server._report_public_ip = self._noop
+        self.server_task = asyncio.create_task(self.server.start())
+        while not all(transport.transport for transport in self.server.transports):
+            await asyncio.sleep(0.01)
+        self.port = self.server.transport.transport.get_extra_info('sockname')[1]
+
+        # 只使用回环接口
+        self._saved_cache = QuicClient._interface_cache
+        QuicClient._interface_cache = (time.monotonic(), {'lo': '127.0.0.1'})
+
+    async def asyncTearDown(self):
+        QuicClient._interface_cache = self._saved_cache
+        self.server.stop()
+        await self.server_task
+        self.tmpdir.cleanup()
+
+    async def _noop(self):
+        pass
+
+    async def _download(self) -> bytes:
+        client = QuicClient('127.0.0.1', self.port)
+        await client.start()
+        try:
+            self.assertTrue(await asyncio.wait_for(client.request_file(DEFAULT_FILENAME), 20))
+            return bytes(client.receiving_files[DEFAULT_FILENAME]['buffer'])
+        finally:
+            client.active_interface.transport.transport.close()
+
+    async def test_transfer_over_multiple_sockets(self):
+        ports = {transport.transport.get_extra_info('sockname')[1] for transport in self.server.transports}
+        self.assertEqual(len(self.server.transports), self.WORKERS)
+        self.assertEqual(ports, {self.port})
+
+        # 多个客户端 (不同源端口) 同时下载，由内核分散到各个套接字
+        results = await asyncio.gather(*(self._download() for _ in range(self.CLIENTS)))
+        for data in results:
+            self.assertEqual(data, self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()